@@ -0,0 +1,281 @@
+'''
+spending analytics over a budget table, computed with numpy on columns of the table kept in memory.
+
+numpy is only needed by this module, import it where it is used so the app still starts without it.
+'''
+import threading
+import numpy as np
+
+__epoch__ = np.datetime64("1970-01-01", "D")
+
+
+class _Column(object):
+    '''
+    growable numpy array, appends are amortized so records entered one by one do not copy the whole column
+    '''
+    __slots__ = ("data", "size")
+
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.empty(capacity, dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        end = self.size + len(values)
+        if end > len(self.data):
+            grown = np.empty(max(end, 2 * len(self.data)), self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = values
+        self.size = end
+
+    def keep(self, mask):
+        '''
+        :param mask: bool array over the values, the values where it is false are removed
+        '''
+        kept = self.view()[mask]
+        self.data[:len(kept)] = kept
+        self.size = len(kept)
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class BudgetAnalytics(object):
+    '''
+    the records of the table in use, as columns: ids, dates as days since 1970-01-01, amounts and reasons as codes
+    into a list of the distinct reasons.
+
+    The columns are refreshed before every aggregate if the table was written to since the last one. The newest
+    records are read again and the older ones are kept, less the deleted ones. The refreshed columns are then checked
+    against the monthly summary of the table, month by month, and the table is reloaded if they do not add up, e.g.
+    when ids older than the newest records were deleted and handed out again. Every date aggregate comes from one
+    bincount of the amounts per day
+    '''
+    def __init__(self, dm, fetch_size=100000, tail_size=4096, *args, **kwargs):
+        '''
+        :param dm: DBManager, the analytics are of its table in use
+        :param fetch_size: number of rows fetched at a time when loading
+        :param tail_size: number of the newest records read again on every refresh
+        '''
+        super().__init__(*args, **kwargs)
+        self.dm = dm
+        self.fetch_size = fetch_size
+        self.tail_size = tail_size
+        self.table = None
+        self._lock = threading.Lock()
+        self.stale = True
+        self._daily = None
+        self._reset()
+
+        dm.add_write_listener(self._invalidate)
+
+    def _reset(self):
+        self.ids = _Column(np.int64)
+        self.days = _Column(np.int32)
+        self.amounts = _Column(np.float64)
+        self.reason_codes = _Column(np.int32)
+        self.reasons = []
+        self._reason_codes = {}
+
+    def _invalidate(self, table=None):
+        # may be called from any thread, the columns are only refreshed when read
+        if table is None or table == self.table:
+            self.stale = True
+
+    def refresh(self):
+        '''
+        brings the columns up to date with the table in use
+        :return: number of records loaded
+        '''
+        with self._lock:
+            if self.table != self.dm.__table__:
+                self.table = self.dm.__table__
+                self._reset()
+                self.stale = True
+            if not self.stale:
+                return self.ids.size
+            self.stale = False
+            self._daily = None
+
+            with self.dm.get_db_conn(write=False) as conn:
+                c = conn.cursor()
+                # the monthly summary is kept up to date by triggers, so this avoids counting the table
+                c.execute('''SELECT month, total, count FROM {}_monthly'''.format(self.table))
+                summary = c.fetchall()
+                count = sum(row[2] for row in summary)
+
+                # the newest records are always read again, sqlite gives the ids of the newest records to the next
+                # ones inserted once they are deleted, e.g. by undo
+                ids = self.ids.view()
+                start = max(len(ids) - self.tail_size, 0)
+                first_id = int(ids[start]) if len(ids) else 0
+                c.execute('''SELECT id, date, reason, amount FROM {} WHERE id>=? ORDER BY id'''.format(self.table),
+                          (first_id,))
+                rows = c.fetchmany(self.fetch_size)
+                if len(ids) and (not rows or rows[0][0] != first_id):
+                    # the oldest of the records read again was deleted, the older ones may have been too
+                    self._load(c, None)
+                    return self.ids.size
+
+                for column in (self.ids, self.days, self.amounts, self.reason_codes):
+                    column.size = start
+                self._load(c, rows)
+                if self.ids.size > count:
+                    self._remove_deleted(c, start, first_id)
+                if not self._matches_summary(summary):
+                    # records were inserted with older ids than the loaded ones, or old ids were reused
+                    self._load(c, None)
+            return self.ids.size
+
+    def _matches_summary(self, summary):
+        '''
+        :param summary: rows of (month, total, count) of the monthly summary of the table
+        :return: whether the loaded records have the same count and total, up to rounding, in every month. The
+        totals per day it is checked with are kept for the date aggregates
+        '''
+        days = self.days.view()
+        if not len(summary) or not len(days):
+            return len(summary) == len(days) == 0
+        # summed per day first, there are far fewer days than records to convert to months
+        first = int(days.min())
+        daily = np.bincount(days - first, weights=self.amounts.view())
+        months = (__epoch__ + first + np.arange(len(daily))).astype("datetime64[M]").astype(np.int64)
+        summary_months = np.array([row[0] for row in summary], "datetime64[M]").astype(np.int64)
+        first_month = min(int(months[0]), int(summary_months.min()))
+        size = max(int(months[-1]), int(summary_months.max())) - first_month + 1
+
+        counts = np.bincount(months - first_month, weights=np.bincount(days - first), minlength=size)
+        totals = np.bincount(months - first_month, weights=daily, minlength=size)
+        summary_counts, summary_totals = np.zeros(size), np.zeros(size)
+        summary_counts[summary_months - first_month] = [row[2] for row in summary]
+        summary_totals[summary_months - first_month] = [row[1] for row in summary]
+        # the summary adds and subtracts amounts one record at a time, so its totals drift a little
+        if not (np.array_equal(counts, summary_counts) and np.allclose(totals, summary_totals, rtol=1e-9, atol=1e-6)):
+            return False
+        self._daily = (first, daily)
+        return True
+
+    def _load(self, c, rows):
+        '''
+        :param c: cursor
+        :param rows: first rows fetched from the cursor, the rest are fetched from it, if none, reload the table
+        '''
+        if rows is None:
+            self._reset()
+            c.execute('''SELECT id, date, reason, amount FROM {} ORDER BY id'''.format(self.table))
+            rows = c.fetchmany(self.fetch_size)
+        while rows:
+            self._append(rows)
+            rows = c.fetchmany(self.fetch_size)
+
+    def _remove_deleted(self, c, end, end_id):
+        '''
+        removes the loaded records before the end index, whose id is end_id, that are no longer in the table
+        '''
+        ids = self.ids.view()
+        c.execute('''SELECT id FROM {} WHERE id<?'''.format(self.table), (end_id,))
+        mask = np.ones(len(ids), bool)
+        mask[:end] = np.isin(ids[:end], np.fromiter((row[0] for row in c), np.int64))
+        for column in (self.ids, self.days, self.amounts, self.reason_codes):
+            column.keep(mask)
+
+    def _append(self, rows):
+        ids, dates, reasons, amounts = zip(*rows)
+        codes = self._reason_codes
+        for reason in reasons:
+            if reason not in codes:
+                codes[reason] = len(self.reasons)
+                self.reasons.append(reason)
+        self.ids.extend(ids)
+        self.days.extend((np.array(dates, "datetime64[D]") - __epoch__).astype(np.int32))
+        self.amounts.extend(amounts)
+        self.reason_codes.extend([codes[reason] for reason in reasons])
+
+    def _get_daily(self):
+        '''
+        :return: (first day, totals of every day from the first to the last day with records), the first day is in
+        days since 1970-01-01
+        '''
+        self.refresh()
+        if self._daily is None:
+            days = self.days.view()
+            if not len(days):
+                self._daily = (0, np.zeros(0))
+            else:
+                first = int(days.min())
+                self._daily = (first, np.bincount(days - first, weights=self.amounts.view()))
+        return self._daily
+
+    def daily_totals(self):
+        '''
+        :return: (datetime64[D] array of every day from the first to the last day with records, totals of each day)
+        '''
+        first, totals = self._get_daily()
+        return __epoch__ + first + np.arange(len(totals)), totals
+
+    def weekly_totals(self):
+        '''
+        :return: (datetime64[D] array of the mondays of every week with days in the budget, totals of each week)
+        '''
+        first, totals = self._get_daily()
+        # 1970-01-01 is a thursday, so day + 3 counts the days since a monday
+        weeks = (first + np.arange(len(totals)) + 3) // 7
+        week_totals = np.bincount(weeks - weeks[0], weights=totals) if len(totals) else np.zeros(0)
+        mondays = (weeks[0] if len(totals) else 0) + np.arange(len(week_totals))
+        return __epoch__ + mondays * 7 - 3, week_totals
+
+    def monthly_totals(self):
+        '''
+        :return: (datetime64[M] array of every month from the first to the last month with records, totals of each)
+        '''
+        first, totals = self._get_daily()
+        if not len(totals):
+            return np.zeros(0, "datetime64[M]"), np.zeros(0)
+        months = (__epoch__ + first + np.arange(len(totals))).astype("datetime64[M]")
+        month_index = (months - months[0]).astype(np.int64)
+        return months[0] + np.arange(month_index[-1] + 1), np.bincount(month_index, weights=totals)
+
+    def rolling_average(self, window=30):
+        '''
+        :param window: number of calendar days averaged, days without records count as zero
+        :return: (datetime64[D] array of every day, average daily spending over the window ending on each day)
+        '''
+        days, totals = self.daily_totals()
+        sums = np.cumsum(totals)
+        sums[window:] = sums[window:] - sums[:-window]
+        return days, sums / np.minimum(np.arange(1, len(totals) + 1), window)
+
+    def year_over_year(self):
+        '''
+        :return: (datetime64[M] array of every month, totals of each month, totals of the same month the year before,
+        change from the year before as a fraction, nan where the year before had no spending)
+        '''
+        months, totals = self.monthly_totals()
+        previous = np.zeros(len(totals))
+        previous[12:] = totals[:-12]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(previous > 0, totals / previous - 1, np.nan)
+        return months, totals, previous, change
+
+    def reason_totals(self, start=None, end=None):
+        '''
+        :param start: first date included, date str, if none, from the first record
+        :param end: last date included, date str, if none, up to the last record
+        :return: list of (reason, total, count) of the records in the range, largest total first
+        '''
+        self.refresh()
+        codes, amounts = self.reason_codes.view(), self.amounts.view()
+        if start is not None or end is not None:
+            days = self.days.view()
+            mask = np.ones(len(days), bool)
+            if start is not None:
+                mask &= days >= (np.datetime64(start, "D") - __epoch__).astype(np.int32)
+            if end is not None:
+                mask &= days <= (np.datetime64(end, "D") - __epoch__).astype(np.int32)
+            codes, amounts = codes[mask], amounts[mask]
+
+        totals = np.bincount(codes, weights=amounts, minlength=len(self.reasons))
+        counts = np.bincount(codes, minlength=len(self.reasons))
+        order = np.argsort(-totals, kind="stable")
+        return [(self.reasons[code], float(totals[code]), int(counts[code])) for code in order if counts[code]]
@@ -1,33 +1,70 @@
 import os
-from json import dumps
+from contextlib import contextmanager
 from tkinter import *
 from tkinter import messagebox, simpledialog, filedialog
-from PIL import Image, ImageTk
 from datetime import datetime, timedelta
 from dbManager import DBManager, __date_format__
-from commands import CommandFactory, Command, EnterRecord, JumpToDate, JumpToMonth
+from recordCache import RecordCache
+from recordGrid import RecordGrid
+from consolidatedReport import ConsolidatedReport
+from dbWorker import DBWorker
+from commands import CommandFactory, Command, EnterRecord, EnterRecords, JumpToDate, JumpToMonth
 
 
 class App(object):
-    date_formats = None
     path = {
         "images": os.path.join(os.path.dirname(os.path.realpath(__file__)), "images"),
         "budgets": os.path.join(os.path.dirname(os.path.realpath(__file__)), "budgets"),
+        "icon_cache": os.path.join(os.path.dirname(os.path.realpath(__file__)), "images", "cache"),
     }
 
-    def __init__(self, logger, *args, **kwargs):
+    def __init__(self, logger, db_path=None, env_path=os.path.join(os.path.dirname(os.path.realpath(__file__)), '.env'),
+                 budgets_path=None, *args, **kwargs):
+        '''
+        :param logger:
+        :param db_path: path of the sqlite db, if none, the db of the current user, see DBManager
+        :param env_path: .env file where the budget in use is remembered, if none, it is not remembered
+        :param budgets_path: folder of the .bp files of the budgets, if none, budgets next to this file
+        '''
         super().__init__(*args, **kwargs)
         self.num_records_displayed = int(os.environ.get("RECORDS_DISPLAYED"))
-        os.makedirs(App.path['budgets'], exist_ok=True)
+        self.budgets_path = budgets_path if budgets_path else App.path['budgets']
+        os.makedirs(self.budgets_path, exist_ok=True)
 
-        self.dm = DBManager(logger)
+        self.dm = DBManager(logger, path=db_path, env_path=env_path)
+        logger.info("Database settings: {}".format(self.dm.get_connection_settings()))
+        # navigation reads go through the cache, pages next to the displayed one are prefetched in the background
+        self.records = RecordCache(self.dm, int(os.environ.get("RECORDS_CACHE_SIZE", 32)))
         self.cf = CommandFactory(self)
+        Command.history.capacity = int(os.environ.get("COMMAND_HISTORY_SIZE", 100))
+        Command.history.merge_navigation = os.environ.get("COMMAND_HISTORY_MERGE_NAVIGATION", "0") == "1"
         self.logger = logger
 
         self.window = Tk()
+        # imports, exports and navigation queries run here, off the tk thread
+        self.worker = DBWorker(self.window, logger)
+        # writes made close together on the tk thread share one commit, which is flushed before anything that reads
+        # from another thread
+        self.dm.set_flush_scheduler(lambda delay, flush: self.window.after(int(delay * 1000), flush))
+        self.commit_counts = {}  # action -> [times run, commits issued]
+        # title of the long job writing to the db, if one is running. Writes from the tk thread would wait for its
+        # transaction to commit, freezing the window, so they are refused until it is done
+        self.writing_job = None
         self.window.resizable(0, 0)  # disable resizing
+        self.window.protocol("WM_DELETE_WINDOW", self.quit)
 
         self.init_menu()
+        self.enter_records_window, self.new_records_text = None, None
+        self.analytics = None  # created when the spending report is first opened
+        self.spending_report_window = None
+        self.consolidated = ConsolidatedReport(self.dm)
+        # budgets written to since their .bp file was last written, only these are saved on quit
+        self.unsaved_budgets = set()
+        self.dm.add_write_listener(lambda table: self.unsaved_budgets.add(table if table else self.dm.__table__))
+        # typing in the search box only searches once no key was pressed for search_delay ms
+        self.search_delay = int(os.environ.get("SEARCH_DELAY_MS", 250))
+        self.search_window, self.search_text, self.search_status, self.search_grid = None, None, None, None
+        self._search_job, self._search_offset, self._search_count = None, 0, 0
 
         # create frames
         self.create_record_frame = Frame(self.window, bg="white", highlightbackground="black", highlightcolor="black",
@@ -42,6 +79,7 @@ class App(object):
 
         self.view_record_frame_3 = Frame(self.window, bg="white", pady=10, padx=10)
         self.view_record_frame_3.pack(fill="x")
+        self.record_grid = RecordGrid(self.view_record_frame_3, self.num_records_displayed)
 
         # input fields for creating a new record
         Label(self.create_record_frame, text="Enter a new withdraw record:", fg="black", bg="white").grid(row=0, sticky=W)
@@ -53,13 +91,27 @@ class App(object):
         self.new_record_date.set(self.get_today_date())
 
         Label(self.create_record_frame, text="Reason", fg="black", bg="white").grid(row=2, column=0, sticky=W)
-        Entry(self.create_record_frame, textvariable=self.new_record_reason).grid(row=2, column=1)
+        self.reason_entry = Entry(self.create_record_frame, textvariable=self.new_record_reason)
+        self.reason_entry.grid(row=2, column=1)
 
         Label(self.create_record_frame, text="Amount", fg="black", bg="white").grid(row=3, column=0, sticky=W)
         Entry(self.create_record_frame, textvariable=self.new_record_amount).grid(row=3, column=1)
 
         Button(self.create_record_frame, text="Enter", command=self.enter_record).grid(row=4, column=0, sticky=W)
 
+        # suggestions for the reason, shown under it over the rest of the window while it is typed in
+        self.reason_suggestions = Listbox(self.window, height=5, takefocus=0, activestyle="none")
+        self.new_record_reason.trace_add("write", lambda *_: self.suggest_reasons())
+        self.reason_entry.bind("<Down>", lambda eve: self._move_reason_suggestion(1))
+        self.reason_entry.bind("<Up>", lambda eve: self._move_reason_suggestion(-1))
+        self.reason_entry.bind("<Return>", lambda eve: self._accept_reason_suggestion())
+        self.reason_entry.bind("<Tab>", lambda eve: self._accept_reason_suggestion())
+        self.reason_entry.bind("<Escape>", lambda eve: self.reason_suggestions.place_forget())
+        # after a moment, so a click on a suggestion still gets to it
+        self.reason_entry.bind("<FocusOut>", lambda eve: self.window.after(150, self.reason_suggestions.place_forget))
+        self.reason_suggestions.bind("<ButtonRelease-1>", lambda eve: self._accept_reason_suggestion(
+            self.reason_suggestions.nearest(eve.y)))
+
         # operations for viewing records
         self.view_record_month, self.view_record_date = StringVar(), StringVar()
         self._current_first_record_id = 0
@@ -97,30 +149,57 @@ class App(object):
         root_menu.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="New Budget (Ctrl-n)", command=self.create_new_budget)
         file_menu.add_command(label="Open Budget (Ctrl-o)", command=self.open_budget)
+        file_menu.add_command(label="Import Workbooks", command=self.import_workbooks)
+        file_menu.add_command(label="Save Budget (Ctrl-s)", command=self.save_budget)
         file_menu.add_command(label="Export as Excel (Ctrl-e)", command=self.export_budget_as_excel)
+        file_menu.add_command(label="Rebuild Monthly Summary", command=self.rebuild_monthly_summary)
+        file_menu.add_command(label="Database Settings", command=self.show_db_settings)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit (Ctrl-q)", command=window.quit)
+        file_menu.add_command(label="Exit (Ctrl-q)", command=self.quit)
 
         # creating the edit sub menu, used for undo and redo a record
         edit_menu = Menu(root_menu)
         root_menu.add_cascade(label="Edit", menu=edit_menu)
-        edit_menu.add_command(label="Undo (Ctrl-z)", command=Command.undo)
-        edit_menu.add_command(label="Redo (Ctrl-y)", command=Command.redo)
+        edit_menu.add_command(label="Undo (Ctrl-z)", command=self.undo)
+        edit_menu.add_command(label="Redo (Ctrl-y)", command=self.redo)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Enter Many Records (Ctrl-m)", command=self.open_enter_records_window)
+        edit_menu.add_command(label="Search Reasons (Ctrl-f)", command=self.open_search_window)
+
+        # creating the view sub menu, used for reports over the whole budget
+        view_menu = Menu(root_menu)
+        root_menu.add_cascade(label="View", menu=view_menu)
+        view_menu.add_command(label="Spending Report (Ctrl-r)", command=self.show_spending_report)
+        view_menu.add_command(label="All Budgets Report (Ctrl-b)", command=self.show_all_budgets_report)
+
+        # creating the debug sub menu, only when DEBUG=1 in .env, which also turns on the query profiler
+        if self.dm.profiler.enabled:
+            debug_menu = Menu(root_menu)
+            root_menu.add_cascade(label="Debug", menu=debug_menu)
+            debug_menu.add_command(label="Action Latency", command=self.show_action_latency)
+            debug_menu.add_command(label="Reset Latency Statistics", command=self.dm.profiler.reset)
 
         # add shortcuts
         shortcuts = {
             "<Control-n>": lambda eve: self.create_new_budget(),
             "<Control-o>": lambda eve: self.open_budget(),
+            "<Control-s>": lambda eve: self.save_budget(),
             "<Control-e>": lambda eve: self.export_budget_as_excel(),
-            "<Control-q>": lambda eve: self.window.quit(),
-            "<Control-z>": lambda eve: Command.undo(),
-            "<Control-y>": lambda eve: Command.redo(),
+            "<Control-q>": lambda eve: self.quit(),
+            "<Control-z>": lambda eve: self.undo(),
+            "<Control-y>": lambda eve: self.redo(),
+            "<Control-m>": lambda eve: self.open_enter_records_window(),
+            "<Control-r>": lambda eve: self.show_spending_report(),
+            "<Control-b>": lambda eve: self.show_all_budgets_report(),
+            "<Control-f>": lambda eve: self.open_search_window(),
         }
 
         for shortcut in shortcuts:
             self.window.bind(shortcut, shortcuts[shortcut])
 
     def create_new_budget(self):
+        if self._is_writing_job_running():
+            return
         filename = simpledialog.askstring("Input", "Please enter name of the new budget", parent=self.window)
         if filename:
             filename = os.path.splitext(filename)[0]
@@ -130,46 +209,359 @@ class App(object):
             self.reload_records()
 
     def open_budget(self):
-        filepath = filedialog.askopenfilename(initialdir=App.path['budgets'], title="Select budget",
+        filepath = filedialog.askopenfilename(initialdir=self.budgets_path, title="Select budget",
                                               filetypes=(("BudgetPy files", "*.bp"), ("Excel files", "*.xlsx")))
-        if filepath:
+        if filepath and not self._is_writing_job_running():
             filename = os.path.splitext(os.path.split(filepath)[1])[0]
+
+            # the budget is only put in use once it is committed, until then the app keeps using the one it had
+            def opened(_):
+                self.dm.set_table_in_use(filename)
+                self._create_budget_file(filename)
+                self.reload_records()
+
             if os.path.splitext(filepath)[1] == '.xlsx':
-                self.dm.excel_to_db(filepath)
+                self._run_long_job("Importing {}".format(filename), self.dm.excel_to_db, filepath, callback=opened,
+                                   writes=True)
             elif os.path.splitext(filepath)[1] == '.bp':
-                self.dm.set_table_in_use(filename)
+                self._run_long_job("Opening {}".format(filename), self.dm.bp_to_db, filepath, callback=opened,
+                                   progress=False, writes=True)
 
-            self._create_budget_file(filename)
+    def import_workbooks(self):
+        '''
+        imports many workbooks at once, each into the budget named after it, parsed in parallel
+        '''
+        filepaths = filedialog.askopenfilenames(title="Select workbooks", filetypes=(("Excel files", "*.xlsx"),))
+        if not filepaths or self._is_writing_job_running():
+            return
 
+        def imported(results):
+            lines = []
+            for file_path, table, inserted, error in results:
+                name = os.path.split(file_path)[1]
+                if error:
+                    lines.append("{}: failed, {}".format(name, error))
+                else:
+                    lines.append("{}: {} records into {}".format(name, inserted, table))
+            messagebox.showinfo("Import Workbooks", "\n".join(lines))
             self.reload_records()
 
+        self._run_long_job("Importing {} workbooks".format(len(filepaths)), self._import_workbooks, list(filepaths),
+                           callback=imported, unit="workbooks", writes=True,
+                           cancelled="the workbooks imported before it was cancelled were kept")
+
+    def _import_workbooks(self, file_paths, progress=None):
+        '''
+        runs in the db worker, also creates the budget files of the imported budgets so they can be opened
+        '''
+        results = self.dm.excels_to_db(file_paths, progress=progress)
+        for _, table, _, error in results:
+            if not error:
+                self._create_budget_file(table)
+        return results
+
     def export_budget_as_excel(self):
-        self.dm.db_to_excel()
-        messagebox.showinfo("Info", "Export Complete!")
+        table = self.dm.__table__
+        self._run_long_job("Exporting {}".format(table), self.dm.db_to_excel, None, table,
+                           callback=lambda _: messagebox.showinfo("Info", "Export Complete!"))
+
+    def _run_long_job(self, title, fn, *args, callback=None, progress=True, unit="records", cancelled=None,
+                      writes=False):
+        '''
+        runs fn in the db worker, with a window showing its progress and a button to cancel it. The job is profiled
+        under the name of fn
+        :param unit: what fn reports the progress of
+        :param cancelled: what is left of the job's changes when it is cancelled, told to the user
+        :param writes: whether fn writes to the db, writes from the tk thread are refused until it is done
+        '''
+        window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        window.title(title)
+        status = StringVar(value="{}...".format(title))
+        Label(window, textvariable=status, fg="black", bg="white", width=40).grid(row=0, sticky=W)
+
+        profiled = self.dm.profiler.start_action(fn.__name__)
+
+        def run(*args, **kwargs):
+            with self.dm.profiler.in_action(profiled):
+                return fn(*args, **kwargs)
+
+        def done(result):
+            self.dm.profiler.finish_action(profiled)
+            if writes:
+                self.writing_job = None
+            window.destroy()
+            if callback:
+                callback(result)
+
+        def failed(e):
+            if e is not None:
+                self.dm.profiler.finish_action(profiled)
+            if writes:
+                self.writing_job = None
+            window.destroy()
+            # e is none when the job was cancelled
+            if e is None:
+                self.alert("{} cancelled, {}".format(title, cancelled if cancelled else "nothing was changed"))
+            else:
+                self.alert("Error while {}: {}".format(title.lower(), str(e)))
+
+        def update_progress(done, total, *records):
+            # batch imports also report the records of the workbook being inserted
+            status.set("{}: {} of {} {}{}".format(title, done, total, unit,
+                                                  ", {} of {} records".format(*records) if records else ""))
+
+        self.dm.flush()
+        if writes:
+            self.writing_job = title
+        job = self.worker.submit(run, *args, callback=done, error_callback=failed,
+                                 progress_callback=update_progress if progress else None)
+        # only jobs that report their progress check whether they were cancelled
+        if progress:
+            Button(window, text="Cancel", command=job.cancel).grid(row=1, sticky=W)
+
+    def _is_writing_job_running(self):
+        '''
+        :return: whether a long job writing to the db is running, the user is told to wait for it if so
+        '''
+        if self.writing_job:
+            self.alert("{} is still running, please wait for it to finish".format(self.writing_job))
+        return self.writing_job is not None
+
+    def rebuild_monthly_summary(self):
+        if self._is_writing_job_running():
+            return
+        self.dm.rebuild_monthly_summary()
+        self.reload_records()
+
+    def show_db_settings(self):
+        settings = self.dm.get_connection_settings()
+        messagebox.showinfo("Database Settings", "\n".join("{}: {}".format(setting, value)
+                                                            for setting, value in settings.items()))
+
+    def show_spending_report(self, refresh_interval=500, num_weeks=8, num_reasons=10):
+        '''
+        opens a window with spending statistics of the budget, recomputed in the db worker whenever records were
+        entered or deleted while it is open. Needs numpy
+        '''
+        # only one window, the analytics are not recomputed by two jobs at once
+        if self.spending_report_window and self.spending_report_window.winfo_exists():
+            self.spending_report_window.lift()
+            return
+        if not self.analytics:
+            try:
+                from analytics import BudgetAnalytics  # only imported when needed, numpy is slow to import
+            except ImportError:
+                self.alert("The spending report needs numpy, install it with pip install numpy")
+                return
+            self.analytics = BudgetAnalytics(self.dm)
+
+        window = self.spending_report_window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        window.title("Spending Report-{}".format(self.dm.__table__))
+        text = StringVar(value="Loading...")
+        Label(window, textvariable=text, fg="black", bg="white", font="TkFixedFont", justify=LEFT).grid(row=0, sticky=W)
+        running = []  # the job recomputing the report, a new one is only started once it is done
+
+        def refresh(force=False):
+            if not window.winfo_exists():
+                return
+            table = self.dm.__table__
+            if not running and (force or self.analytics.stale or self.analytics.table != table):
+                def done(report):
+                    running.clear()
+                    if window.winfo_exists():
+                        window.title("Spending Report-{}".format(table))
+                        text.set(report)
+
+                def failed(e):
+                    running.clear()
+                    if e is not None and window.winfo_exists():
+                        text.set("Error while computing the report: {}".format(str(e)))
+
+                # writes still waiting for their group commit would not be seen by the worker
+                self.dm.flush()
+                running.append(self.worker.submit(self._spending_report, num_weeks, num_reasons, callback=done,
+                                                  error_callback=failed))
+            window.after(refresh_interval, refresh)
+
+        refresh(True)
+
+    def _spending_report(self, num_weeks, num_reasons):
+        '''
+        runs in the db worker
+        '''
+        analytics = self.analytics
+        days, daily = analytics.daily_totals()
+        if not len(days):
+            return "There is nothing in this budget!"
+
+        months, totals, previous, change = analytics.year_over_year()
+        _, averages = analytics.rolling_average(30)
+        lines = ["{}: {:.2f}, {}".format(months[-1], totals[-1], "{:+.1%} on a year ago ({:.2f})".format(
+            change[-1], previous[-1]) if previous[-1] > 0 else "nothing a year ago"),
+                 "Average per day over the 30 days to {}: {:.2f}".format(days[-1], averages[-1]), "",
+                 "Weekly totals:"]
+        weeks, week_totals = analytics.weekly_totals()
+        for week, total in list(zip(weeks, week_totals))[-num_weeks:]:
+            lines.append("  week of {}: {:>12.2f}".format(week, total))
+
+        year = str(days[-1].astype("datetime64[Y]"))
+        lines += ["", "Top reasons in {}:".format(year)]
+        for reason, total, count in analytics.reason_totals("{}-01-01".format(year))[:num_reasons]:
+            lines.append("  {:24} {:>12.2f} in {} records".format(str(reason)[:24], total, count))
+        return "\n".join(lines)
+
+    def show_all_budgets_report(self, refresh_interval=1000):
+        '''
+        opens a window with the monthly totals of this year of every budget, and their total, refreshed in the db
+        worker every refresh_interval ms while open. Only the budgets written to since the last refresh are queried
+        again
+        '''
+        window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        window.title("All Budgets Report")
+        text = StringVar(value="Loading...")
+        Label(window, textvariable=text, fg="black", bg="white", font="TkFixedFont", justify=LEFT).grid(row=0, sticky=W)
+
+        def done(report):
+            if window.winfo_exists():
+                text.set(report)
+                window.after(refresh_interval, refresh)
+
+        def failed(e):
+            if e is not None and window.winfo_exists():
+                text.set("Error while computing the report: {}".format(str(e)))
+                window.after(refresh_interval, refresh)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            # writes still waiting for their group commit would not be seen by the worker
+            self.dm.flush()
+            # the next refresh is only scheduled once this one is done, so they never pile up in the worker
+            self.worker.submit(self._all_budgets_report, callback=done, error_callback=failed)
+
+        refresh()
+
+    def _all_budgets_report(self):
+        '''
+        runs in the db worker
+        '''
+        today = datetime.today()
+        year = today.strftime("%Y")
+        monthly = self.consolidated.monthly_totals("{}-01".format(year), "{}-12".format(year))
+        budgets = sorted(monthly)
+        totals = {(budget, month): total for budget in budgets for month, total, _ in monthly[budget]}
+        months = sorted({month for _, month in totals})
+
+        row_format = "{:14}" + "{:>14}" * (len(budgets) + 1)
+        lines = [row_format.format(year, *[budget[:13] for budget in budgets] + ["All"])]
+        for month in months:
+            amounts = [totals.get((budget, month), 0) for budget in budgets]
+            lines.append(row_format.format(month, *["{:.2f}".format(amount) for amount in amounts + [sum(amounts)]]))
+
+        for label, start in (("Year to date", "{}-01-01".format(year)),
+                             ("Last 30 days", (today - timedelta(days=29)).strftime(__date_format__))):
+            ranges = self.consolidated.range_totals(start, today.strftime(__date_format__))
+            amounts = [ranges.get(budget, (0, 0))[0] for budget in budgets]
+            lines.append(row_format.format(label, *["{:.2f}".format(amount) for amount in amounts + [sum(amounts)]]))
+        return "\n".join(lines)
+
+    def show_action_latency(self, refresh_interval=1000):
+        '''
+        opens a window with the latency percentiles of each action, refreshed every refresh_interval ms while open
+        '''
+        window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        window.title("Action Latency")
+        text = StringVar()
+        Label(window, textvariable=text, fg="black", bg="white", font="TkFixedFont", justify=LEFT).grid(row=0, sticky=W)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            lines = ["{:16}{:>7}{:>9}{:>9}{:>9}{:>9}{:>9}{:>10}{:>9}{:>9}".format(
+                "action", "runs", "p50 ms", "p90 ms", "p99 ms", "max ms", "queries", "query ms", "rows", "commits")]
+            for row in self.dm.profiler.report():
+                runs, commits = self.commit_counts.get(row["action"], [0, 0])
+                lines.append("{:16}{:>7}{:>9.2f}{:>9.2f}{:>9.2f}{:>9.2f}{:>9.1f}{:>10.2f}{:>9.1f}{:>9}".format(
+                    row["action"][:15], row["runs"], row["p50_ms"], row["p90_ms"], row["p99_ms"], row["max_ms"],
+                    row["queries"], row["query_ms"], row["rows"], "{:.1f}".format(commits / runs) if runs else "-"))
+            stats = self.records.stats()
+            lines.append("")
+            lines.append("record cache: {} of {} pages, {} hits, {} misses, {:.0%} hit rate".format(
+                stats["pages"], stats["size"], stats["hits"], stats["misses"], stats["hit_rate"]))
+            text.set("\n".join(lines))
+            window.after(refresh_interval, refresh)
+
+        refresh()
+
+    def save_budget(self, table=None):
+        '''
+        :param table: budget saved, if none, the budget in use
+        '''
+        table = table if table else self.dm.__table__
+        self.unsaved_budgets.discard(table)
+        self.dm.db_to_snapshot(os.path.join(self.budgets_path, "{}.bp".format(table)), table)
+
+    def quit(self):
+        self.worker.shutdown()
+        try:
+            self.dm.flush()
+        except Exception as e:
+            self.logger.error("Error while saving records: {}".format(str(e)))
+        for table in list(self.unsaved_budgets):
+            try:
+                self.save_budget(table)
+            except Exception as e:
+                self.logger.error("Error while saving budget {}: {}".format(table, str(e)))
+        self.window.quit()
 
     def _create_budget_file(self, name):
-        path = os.path.join(App.path['budgets'], "{}.bp".format(name))
+        path = os.path.join(self.budgets_path, "{}.bp".format(name))
         if not os.path.exists(path):
-            with open(path, "w") as f:
-                d = {"db": self.dm.__db_name__,
-                     "table_name": name}
-                f.write(dumps(d))
+            self.dm.db_to_snapshot(path, name)
 
     @staticmethod
     def add_button_image(image_name, command, frame, row, column, size=(15, 15)):
-        image = ImageTk.PhotoImage(Image.open(os.path.join(App.path['images'], image_name)).resize(size))
+        image = App._load_icon(image_name, size)
         btn = Button(frame, image=image, command=command)
         btn.image = image  # stupid tkinter needs to keep a reference to the photo object, else nothing would should up
         btn.grid(row=row, column=column, sticky=W)
 
+    @staticmethod
+    def _load_icon(image_name, size):
+        '''
+        :return: the image resized to size, loaded by tk from a cache of resized images. PIL is only imported to fill
+        the cache when an image is missing from it or changed
+        '''
+        source = os.path.join(App.path['images'], image_name)
+        cached = os.path.join(App.path['icon_cache'], "{}_{}x{}.png".format(os.path.splitext(image_name)[0], *size))
+        if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(source):
+            from PIL import Image
+            os.makedirs(App.path['icon_cache'], exist_ok=True)
+            Image.open(source).resize(size).save(cached)
+
+        try:
+            return PhotoImage(file=cached)
+        except TclError:
+            # tk older than 8.6 cannot read png
+            from PIL import Image, ImageTk
+            return ImageTk.PhotoImage(Image.open(cached))
+
     def reload_records(self):
         self.window.title("BudgetPy-{}".format(self.dm.__table__))
-        self.init_record_viewing_date()
-        self.init_record_viewing_records()
-
-    def init_record_viewing_date(self):
-        if self.dm.get_num_records() > 0:
-            default_date = self.dm.get_last_date()
+        if not self.dm.reasons.built:
+            # loads the reason index in the background, before the first suggestion needs it
+            self.worker.submit(self.dm.reasons.suggest, "")
+        num_record = self.num_records_displayed
+        self._navigate(lambda: self.records.get_withdraws_before_date(num=num_record), self._display_latest_records,
+                       "reload_records")
+
+    def _display_latest_records(self, records, monthly_total):
+        self.init_record_viewing_date(records)
+        self.init_record_viewing_records(records, monthly_total)
+
+    def init_record_viewing_date(self, records=None):
+        if records:
+            default_date = records[0][1]
         else:
             default_date = datetime.today().strftime(__date_format__)
         default_month = "-".join(default_date.split("-")[:-1])
@@ -177,48 +569,115 @@ class App(object):
         self.view_record_date.set(default_date)
 
     # make sure to call this function after you have called "init_record_viewing_date"
-    def init_record_viewing_records(self):
-        if self.dm.get_num_records() > 0:
-            self._jump_to_date()
+    def init_record_viewing_records(self, records=None, monthly_total=None):
+        if records:
+            self._current_first_record_id = int(records[0][0])
+            self.display_records(records, monthly_total)
         else:
             # if there is no records, just use empty dummy records
-            for widget in self.view_record_frame_3.winfo_children():
-                widget.destroy()
+            self._current_first_record_id = 0
+            self.display_no_records()
+
+    def display_no_records(self):
+        self.record_grid.display([])
+
+    def _navigate(self, query, display=None, action="navigation"):
+        '''
+        :param query: called in the db worker, returns the page of records to display
+        :param display: called with the records and their monthly total, defaults to displaying them as the current page
+        :param action: name the navigation is profiled under, it is timed until the page is displayed
+
+        The page is only displayed if no other navigation was started in the meantime, else it is dropped
+        '''
+        profiled = self.dm.profiler.start_action(action)
 
-            self.display_empty_records(self.num_records_displayed, 0)
+        def fetch():
+            with self.dm.profiler.in_action(profiled):
+                records = query()
+                return records, self.dm.get_monthly_total(records[0][1]) if records else 0
 
-            Label(self.view_record_frame_3, text="Total: {:.2f}".format(0), fg="black", bg="white", borderwidth=2,
-                  relief="ridge").grid(row=self.num_records_displayed, pady=5, sticky=W)
+        def done(result):
+            (display if display else self._display_page)(*result)
+            self.dm.profiler.finish_action(profiled)
 
-            Label(self.view_record_frame_3, text="Monthly Total: {:.2f}".format(0), fg="black", bg="white",
-                  borderwidth=2, relief="ridge").grid(row=self.num_records_displayed, column=1, pady=5, sticky=W)
+        def failed(e):
+            self._navigation_failed(e)
+            self.dm.profiler.finish_action(profiled)
+
+        with self._count_commits(action):
+            self.dm.flush()
+        self.worker.submit(fetch, channel="navigation", callback=done, error_callback=failed)
+
+    def _display_page(self, records, monthly_total):
+        self._current_first_record_id = int(records[0][0])
+        self.display_records(records, monthly_total)
+
+    def _navigation_failed(self, e):
+        if e is None:
+            return
+        self.alert(str(e))
+        self.logger.error(str(e))
 
     def jump_to_prev_records(self, num_record=None):
         num_record = num_record if num_record else self.num_records_displayed
-        self.jump_to_id(self._current_first_record_id - num_record)
+        self._jump_back(num_record)
 
     def jump_to_prev_record(self):
-        self.jump_to_id(self._current_first_record_id - 1)
+        self._jump_back(1)
 
     def jump_to_next_record(self):
-        self.jump_to_id(self._current_first_record_id + 1)
+        self._jump_forward(1)
 
     def jump_to_next_records(self, num_record=None):
         num_record = num_record if num_record else self.num_records_displayed
-        self.jump_to_id(self._current_first_record_id + num_record)
+        self._jump_forward(num_record)
 
-    def jump_to_id(self, id, num_record=None):
+    def _jump_back(self, steps, num_record=None):
         num_record = num_record if num_record else self.num_records_displayed
-        if self.dm.get_num_records() < 1:
+        first_id = self._current_first_record_id
+        if not first_id:
             self.alert("There is nothing in this budget!")
             return
+
+        def query():
+            # the new page starts steps records before the current first record, but stops early so that it still
+            # ends at the oldest record if there are fewer than that left, so one seek on the primary key fetches it.
+            # Always fetch enough for a whole page of steps so single and page steps share the same cached result
+            records = self.records.get_records_older_than_id(first_id, max(steps, num_record) + num_record - 1)
+            if not records:
+                raise ValueError("Date out of range! Records exhausted!")
+            start = min(steps, max(len(records) - num_record + 1, 1)) - 1
+            return records[start:start + num_record]
+
+        self._navigate(query, action="jump_back")
+
+    def _jump_forward(self, steps, num_record=None):
+        num_record = num_record if num_record else self.num_records_displayed
+        first_id = self._current_first_record_id
+        if not first_id:
+            self.alert("There is nothing in this budget!")
+            return
+
+        def query():
+            # the new page starts steps records after the current first record, or at the newest record if there are
+            # fewer than that left
+            records = self.records.get_records_newer_than_id(first_id, max(steps, num_record))
+            if not records:
+                raise ValueError("Date out of range! Records exhausted!")
+            return self._get_records_after_id(int(records[min(steps, len(records)) - 1][0]), num_record)
+
+        self._navigate(query, action="jump_forward")
+
+    def jump_to_id(self, id, num_record=None):
+        num_record = num_record if num_record else self.num_records_displayed
+        self._navigate(lambda: self._get_records_after_id(id, num_record), action="jump_to_id")
+
+    def _get_records_after_id(self, id, num_record):
         try:
-            records = self.dm.get_records_after_id(id, num_record)
-            self._current_first_record_id = int(records[0][0])
-            self.display_records(records)
+            return self.records.get_records_after_id(id, num_record)
         except ValueError as e:
-            self.alert("Date out of range! Records exhausted!")
             self.logger.error(str(e))
+            raise ValueError("Date out of range! Records exhausted!")
 
     def jump_to_month(self):
         self._execute_command(JumpToMonth)
@@ -237,65 +696,195 @@ class App(object):
         self._execute_command(JumpToDate)
 
     def _jump_to_date(self, num_record=None):
-        if self.dm.get_num_records() == 0:
-            return
-
         num_record = num_record if num_record else self.num_records_displayed
         try:
-            date = datetime.strptime(self._convert_date(self.view_record_date.get()), __date_format__)
-            first_valid_date = None
-            first_recorded_date = datetime.strptime(self.dm.get_first_date(), __date_format__)
-
-            records = self.dm.get_withdraw(date)
-            records = records if records else []
-            while len(records) < num_record and date >= first_recorded_date:
-                date -= timedelta(days=1)
-                more_records = self.dm.get_withdraw(date)
-                if more_records:
-                    records += more_records
-
-                    if not first_valid_date:
-                        first_valid_date = date
-                        self.view_record_month.set(self._trim_day(date.strftime(__date_format__)))
-
-            self._current_first_record_id = int(records[0][0])
-
-            self.display_records(records)
-
+            date = self._convert_date(self.view_record_date.get())
         except ValueError as e:
             self.alert(str(e))
+            return
+
+        def display(records, monthly_total):
+            if not records:
+                self.display_no_records()
+                return
 
-    def display_records(self, records):
-        for widget in self.view_record_frame_3.winfo_children():
-            widget.destroy()
+            if records[0][1] != date:
+                self.view_record_month.set(self._trim_day(records[0][1]))
+            self._display_page(records, monthly_total)
 
-        total = 0
-        for index, record in enumerate(records):
-            Label(self.view_record_frame_3, text=record[1], fg="black", bg="white").grid(row=index, padx=5, sticky=W)
-            Label(self.view_record_frame_3, text=record[2], fg="black", bg="white").grid(row=index, column=1, padx=5,
-                                                                                         sticky=W)
-            Label(self.view_record_frame_3, text=record[3], fg="black", bg="white").grid(row=index, column=2, padx=5,
-                                                                                         sticky=W)
-            total += float(record[3])
+        # a single query for the latest records on or before the date, no matter how sparse the data is
+        self._navigate(lambda: self.records.get_withdraws_before_date(date, num_record), display, "jump_to_date")
 
-        self.display_empty_records(self.num_records_displayed - len(records), len(records))
+    def display_records(self, records, monthly_total=None):
+        if self.record_grid.num_rows != self.num_records_displayed:
+            self.record_grid.resize(self.num_records_displayed)
+        records = records[:self.num_records_displayed]
 
-        Label(self.view_record_frame_3, text="Total: {:.2f}".format(total), fg="black", bg="white", borderwidth=2,
-              relief="ridge").grid(row=self.num_records_displayed, pady=5, sticky=W)
+        total = sum(float(record[3]) for record in records)
+        if monthly_total is None:
+            monthly_total = self.dm.get_monthly_total(records[0][1])
+        self.record_grid.display(records, total, monthly_total)
 
-        date = datetime.strptime(records[0][1], __date_format__)
-        Label(self.view_record_frame_3, text="Monthly Total: {:.2f}".format(self.dm.get_monthly_total(date)),
-              fg="black", bg="white", borderwidth=2, relief="ridge")\
-            .grid(row=self.num_records_displayed, column=1, pady=5, sticky=W)
+        self.worker.submit(self._prefetch_neighbour_pages, self._current_first_record_id, self.num_records_displayed,
+                           channel="prefetch")
+
+    def _prefetch_neighbour_pages(self, first_id, num_record):
+        '''
+        warms the record cache with the pages the arrow buttons would show next, using the same queries they use
+        '''
+        if not first_id:
+            return
 
-    def display_empty_records(self, num, starting_row):
-        for i in range(starting_row, starting_row+num):
-            Label(self.view_record_frame_3, text="", fg="black", bg="white").grid(row=i, padx=5, sticky=W)
-            Label(self.view_record_frame_3, text="", fg="black", bg="white").grid(row=i, column=1, padx=5, sticky=W)
-            Label(self.view_record_frame_3, text="", fg="black", bg="white").grid(row=i, column=2, padx=5, sticky=W)
+        with self.dm.profiler.action("prefetch"):
+            self.records.get_records_older_than_id(first_id, 2 * num_record - 1)
+            newer = self.records.get_records_newer_than_id(first_id, num_record)
+            for steps in {1, num_record}:
+                if newer:
+                    self.records.get_records_after_id(int(newer[min(steps, len(newer)) - 1][0]), num_record)
 
     def enter_record(self):
-        self._execute_command(EnterRecord)
+        if not self._is_writing_job_running():
+            self._execute_command(EnterRecord)
+
+    def open_enter_records_window(self):
+        if self.enter_records_window and self.enter_records_window.winfo_exists():
+            self.enter_records_window.lift()
+            return
+
+        self.enter_records_window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        self.enter_records_window.title("Enter Many Records")
+        Label(self.enter_records_window, text="Paste one record per line, as date, reason, amount\n"
+                                              "(comma or tab separated):", fg="black", bg="white", justify=LEFT)\
+            .grid(row=0, sticky=W)
+        self.new_records_text = Text(self.enter_records_window, width=60, height=15)
+        self.new_records_text.grid(row=1, column=0)
+        Button(self.enter_records_window, text="Enter", command=self.enter_records).grid(row=2, column=0, sticky=W)
+
+    def enter_records(self):
+        if not self._is_writing_job_running():
+            self._execute_command(EnterRecords)
+
+    def open_search_window(self):
+        if self.search_window and self.search_window.winfo_exists():
+            self.search_window.lift()
+            return
+
+        self.search_window = Toplevel(self.window, bg="white", pady=10, padx=10)
+        self.search_window.title("Search Reasons")
+        self.search_text, self.search_status = StringVar(), StringVar()
+        self._search_offset, self._search_count = 0, 0
+
+        Label(self.search_window, text="Search reasons:", fg="black", bg="white").grid(row=0, sticky=W)
+        entry = Entry(self.search_window, textvariable=self.search_text, width=30)
+        entry.grid(row=0, column=1, sticky=W)
+        entry.focus_set()
+        Label(self.search_window, textvariable=self.search_status, fg="black", bg="white")\
+            .grid(row=1, columnspan=2, sticky=W)
+
+        frame = Frame(self.search_window, bg="white", pady=10)
+        frame.grid(row=2, columnspan=2, sticky=W)
+        self.search_grid = RecordGrid(frame, self.num_records_displayed, "Matching Total")
+
+        Button(self.search_window, text="Newer", command=lambda: self.search_page(-1)).grid(row=3, column=0, sticky=W)
+        Button(self.search_window, text="Older", command=lambda: self.search_page(1)).grid(row=3, column=1, sticky=W)
+        self.search_text.trace_add("write", lambda *_: self._schedule_search())
+
+    def _schedule_search(self):
+        # every key pressed restarts the wait
+        if self._search_job:
+            self.window.after_cancel(self._search_job)
+        self._search_job = self.window.after(self.search_delay, self._search, 0)
+
+    def search_page(self, direction):
+        '''
+        :param direction: -1 for the page of newer matches, 1 for the page of older ones
+        '''
+        offset = self._search_offset + direction * self.num_records_displayed
+        if 0 <= offset < self._search_count:
+            self._search(offset)
+
+    def _search(self, offset):
+        self._search_job = None
+        num_record = self.num_records_displayed
+        profiled = self.dm.profiler.start_action("search")
+
+        def search(text):
+            with self.dm.profiler.in_action(profiled):
+                return self.dm.search_records(text, offset, num_record)
+
+        def done(result):
+            self.dm.profiler.finish_action(profiled)
+            if not self.search_window.winfo_exists():
+                return
+            records, self._search_count, total = result
+            self._search_offset = offset
+            self.search_grid.display(records, sum(float(record[3]) for record in records), total)
+            if records:
+                self.search_status.set("{} to {} of {} matching records".format(offset + 1, offset + len(records),
+                                                                               self._search_count))
+            else:
+                self.search_status.set("No matching records" if self.search_text.get().strip() else "")
+
+        def failed(e):
+            self.dm.profiler.finish_action(profiled)
+            if e is not None:
+                self.alert(str(e))
+
+        # writes still waiting for their group commit would not be seen by the worker
+        self.dm.flush()
+        # searches supersede each other, only the results of the latest one are displayed
+        self.worker.submit(search, self.search_text.get(), channel="search", callback=done, error_callback=failed)
+
+    def get_new_records_text(self):
+        if self.new_records_text and self.new_records_text.winfo_exists():
+            return self.new_records_text.get("1.0", END)
+        return ""
+
+    def clear_new_records_text(self):
+        if self.new_records_text and self.new_records_text.winfo_exists():
+            self.new_records_text.delete("1.0", END)
+
+    def suggest_reasons(self):
+        '''
+        shows the reasons starting with what was typed in the reason field, only while it is being typed in
+        '''
+        text = self.new_record_reason.get()
+        suggestions = self.dm.reasons.suggest(text) if text and self.window.focus_get() is self.reason_entry else []
+        if not suggestions or suggestions == [text]:
+            self.reason_suggestions.place_forget()
+            return
+
+        self.reason_suggestions.delete(0, END)
+        self.reason_suggestions.insert(END, *suggestions)
+        self.reason_suggestions.configure(height=len(suggestions))
+        self.reason_suggestions.place(in_=self.reason_entry, x=0, rely=1, relwidth=1)
+        self.reason_suggestions.lift()
+
+    def _move_reason_suggestion(self, step):
+        if not self.reason_suggestions.winfo_ismapped():
+            return
+        selected = self.reason_suggestions.curselection()
+        index = min(max(selected[0] + step if selected else 0, 0), self.reason_suggestions.size() - 1)
+        self.reason_suggestions.selection_clear(0, END)
+        self.reason_suggestions.selection_set(index)
+        return "break"
+
+    def _accept_reason_suggestion(self, index=None):
+        '''
+        :param index: index of the suggestion to fill in the reason field, if none, the selected one
+        '''
+        if not self.reason_suggestions.winfo_ismapped():
+            return
+        if index is None:
+            selected = self.reason_suggestions.curselection()
+            if not selected:
+                return
+            index = selected[0]
+        reason = self.reason_suggestions.get(index)
+        self.reason_suggestions.place_forget()
+        self.new_record_reason.set(reason)
+        self.reason_entry.icursor(END)
+        return "break"
 
     def set_record_fields(self, date, reason, amount):
         self.new_record_date.set(date)
@@ -304,52 +893,80 @@ class App(object):
         self.reload_records()
 
     def _execute_command(self, command_class):
-        try:
-            c = self.cf.get_command(command_class)
-            c.execute()
-        except Exception as e:
-            self.alert(str(e))
+        with self._track_action(command_class.__name__):
+            try:
+                c = self.cf.get_command(command_class)
+                c.execute()
+            except Exception as e:
+                self.alert(str(e))
 
-    @staticmethod
-    def _get_date_formats():
-        if not App.date_formats:
-            year = ['%y', "%-y", "%Y"]
-            month = ['%m', "%-m", "%b", "%B"]
-            day = ['%d', "%-d"]
-            date_formats = []
-            for y in year:
-                for m in month:
-                    for d in day:
-                        date_formats += [y + "-" + m + "-" + d]
-            App.date_formats = date_formats
-        return App.date_formats
+    def undo(self):
+        if self._is_writing_job_running():
+            return
+        with self._track_action("undo"):
+            Command.undo()
+            self.dm.flush()
+
+    def redo(self):
+        if self._is_writing_job_running():
+            return
+        with self._track_action("redo"):
+            Command.redo()
+            self.dm.flush()
+
+    @contextmanager
+    def _track_action(self, action):
+        '''
+        counts the commits issued by the block, and times it as a run of the action when profiling
+        '''
+        with self._count_commits(action), self.dm.profiler.action(action):
+            yield
 
+    @contextmanager
+    def _count_commits(self, action):
+        commit_count = self.dm.commit_count
+        try:
+            yield
+        finally:
+            counts = self.commit_counts.setdefault(action, [0, 0])
+            counts[0] += 1
+            counts[1] += self.dm.commit_count - commit_count
+            self.logger.debug("{} issued {} commits".format(action, self.dm.commit_count - commit_count))
+
+    # the conversion rules are shared with DBManager, which applies them to records inserted in bulk
     @staticmethod
     def _convert_date(date):
         '''
         :param date:
         :return: convert the given date string into the desired format
         '''
-        for fmt in App._get_date_formats():
-            try:
-                return datetime.strptime(date, fmt).strftime(__date_format__)
-            except ValueError:
-                pass
-
-        raise ValueError("{} is not a recognized date".format(date))
+        return DBManager._convert_date(date)
 
     @staticmethod
     def _convert_amount(amount):
-        try:
-            return float(amount)
-        except ValueError:
-            raise ValueError("{} is not a valid number".format(amount))
+        return DBManager._convert_amount(amount)
 
     @staticmethod
     def _convert_reason(reason):
-        if reason != "":
-            return reason
-        raise ValueError("reason cannot be empty")
+        return DBManager._convert_reason(reason)
+
+    @staticmethod
+    def _parse_records_text(text):
+        '''
+        :param text: one record per line, as "date, reason, amount", fields may also be separated by tabs as when
+        pasting cells from Excel
+        :return: list of (date, reason, amount) strs, not yet validated
+        '''
+        records = []
+        for idx, line in enumerate(text.splitlines()):
+            if not line.strip():
+                continue
+            sep = "\t" if "\t" in line else ","
+            fields = [field.strip() for field in line.split(sep)]
+            if len(fields) < 3:
+                raise ValueError("line {}: expected date, reason and amount".format(idx + 1))
+            records.append((fields[0], sep.join(fields[1:-1]), fields[-1]))
+        return records
 
     @staticmethod
     def _trim_day(date):
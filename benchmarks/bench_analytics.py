@@ -0,0 +1,74 @@
+'''
+times BudgetAnalytics on a generated budget: the first load of the table, then entering a record, undoing it and
+entering a bulk of records, each followed by recomputing every aggregate of the spending report. A GROUP BY of the
+table per month and per reason is timed for comparison.
+
+usage: python -m benchmarks.bench_analytics [records] [record entries]
+'''
+import logging
+import os
+import sys
+import tempfile
+from time import perf_counter
+from statistics import median
+from dbManager import DBManager
+from analytics import BudgetAnalytics
+from benchmarks.generator import generate_records, generate_table
+
+
+def recompute(analytics):
+    analytics.year_over_year()
+    analytics.rolling_average(30)
+    analytics.weekly_totals()
+    analytics.reason_totals()
+
+
+def time_median(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    os.environ.setdefault("CURRENT_DB_TABLE", "General")
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DBManager(logging.getLogger(__name__), path=os.path.join(tmp, "bench.db"), env_path=None)
+        generate_table(dm, "Generated", generate_records(num_records, gaps="weekends"))
+        analytics = BudgetAnalytics(dm)
+
+        start = perf_counter()
+        recompute(analytics)
+        print("{} records".format(num_records))
+        print("first load and aggregates: {:10.1f} ms".format((perf_counter() - start) * 1e3))
+
+        def enter():
+            dm.insert_new_withdraw("2019-12-30", "entered", 12.5)
+            recompute(analytics)
+        print("enter a record:            {:10.1f} ms".format(time_median(enter, runs) * 1e3))
+
+        def undo():
+            dm.delete_records([dm.get_records_after_id(2 ** 62, 1)[0][0]])
+            recompute(analytics)
+        print("undo a record:             {:10.1f} ms".format(time_median(undo, runs) * 1e3))
+
+        def enter_many():
+            dm.insert_many([("2019-12-31", "bulk", 1.5)] * 1000)
+            recompute(analytics)
+        print("enter 1000 records:        {:10.1f} ms".format(time_median(enter_many, runs) * 1e3))
+
+        def group_by():
+            with dm.get_db_conn(write=False) as conn:
+                conn.execute("SELECT substr(date, 1, 7), SUM(amount) FROM Generated GROUP BY 1").fetchall()
+                conn.execute("SELECT reason, SUM(amount), COUNT(*) FROM Generated GROUP BY reason").fetchall()
+        print("sql group by, for scale:   {:10.1f} ms".format(time_median(group_by, 3) * 1e3))
+        dm.__del__()
+
+
+if __name__ == "__main__":
+    main()
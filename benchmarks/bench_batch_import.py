@@ -0,0 +1,51 @@
+'''
+times DBManager.excels_to_db importing a folder of generated yearly workbooks with 1, 2, 4 and 8 processes parsing
+them, each into a fresh db. The speedup is limited by the number of cores and by the single thread inserting the
+records.
+
+usage: python -m benchmarks.bench_batch_import [workbooks] [records per workbook] [workers ...]
+'''
+import logging
+import os
+import sys
+import tempfile
+from datetime import date
+from time import perf_counter
+from dbManager import DBManager
+from benchmarks.generator import generate_records, generate_workbook
+
+
+def main():
+    num_workbooks = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    num_records = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 2, 4, 8]
+
+    os.environ.setdefault("CURRENT_DB_TABLE", "General")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for idx in range(num_workbooks):
+            year = 2017 + idx
+            paths.append(os.path.join(tmp, "Year{}.xlsx".format(year)))
+            generate_workbook(paths[-1], generate_records(num_records, first_date=date(year, 1, 1), num_days=365,
+                                                          seed=idx))
+        print("{} workbooks of {} records, {} cores".format(num_workbooks, num_records, os.cpu_count()))
+
+        single = None
+        for workers in worker_counts:
+            dm = DBManager(logging.getLogger(__name__), path=os.path.join(tmp, "bench{}.db".format(workers)),
+                           env_path=None)
+            start = perf_counter()
+            results = dm.excels_to_db(paths, workers=workers)
+            seconds = perf_counter() - start
+            dm.__del__()
+
+            errors = [error for _, _, _, error in results if error]
+            if errors:
+                raise SystemExit("import failed: {}".format(errors[0]))
+            single = single or seconds
+            print("{} workers: {:8.3f}s {:10.0f} records/s  speedup {:.2f}x".format(
+                workers, seconds, sum(inserted for _, _, inserted, _ in results) / seconds, single / seconds))
+
+
+if __name__ == "__main__":
+    main()
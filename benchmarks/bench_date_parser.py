@@ -0,0 +1,58 @@
+'''
+checks that dateParser.convert_date gives the same result as trying every strptime format, then times both.
+
+usage: python -m benchmarks.bench_date_parser [repeats]
+'''
+import sys
+from timeit import timeit
+from dateParser import convert_date, convert_date_strptime
+
+# inputs the app sees, plus the edge cases of the strptime formats
+DATES = [
+    "2018-08-09", "2018-8-9", "18-08-09", "18-8-9", "68-01-01", "69-01-01", "99-12-31", "00-1-1",
+    "2018-Aug-09", "2018-aug-9", "18-AUG-9", "2018-August-09", "18-september-30", "2018-Sep-1", "2018-Sept-1",
+    "2016-02-29", "2017-02-29", "2018-04-31", "2018-13-01", "2018-0-01", "2018-00-01", "2018-01-0", "2018-01-00",
+    "2018-01-32", "2018-1-010", "0999-01-01", "1000-01-01", "9999-12-31", "201-01-01", "20180-01-01",
+    "2018-01- 5", " 2018-01-05", "2018-01-05 ", "2018/01/05", "2018-01", "", "abc", "18-Foo-01", "18--1-01",
+    "２０１８-01-05", "2018-01-05-", "2018-1-1x",
+]
+
+
+def strptime_result(date):
+    try:
+        return convert_date_strptime(date)
+    except ValueError as e:
+        return "ValueError: {}".format(e)
+
+
+def fast_result(date):
+    try:
+        return convert_date(date)
+    except ValueError as e:
+        return "ValueError: {}".format(e)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    mismatches = [(date, strptime_result(date), fast_result(date)) for date in DATES
+                  if strptime_result(date) != fast_result(date)]
+    for mismatch in mismatches:
+        print("mismatch for {!r}: strptime {!r}, convert_date {!r}".format(*mismatch))
+    print("{} inputs checked, {} mismatches".format(len(DATES), len(mismatches)))
+
+    valid = [date for date in DATES if not strptime_result(date).startswith("ValueError")]
+    strptime_time = timeit(lambda: [convert_date_strptime(date) for date in valid], number=repeats)
+    # the uncached time is what the first sight of every distinct string costs, e.g. during a bulk import
+    uncached_time = timeit(lambda: [convert_date.__wrapped__(date) for date in valid], number=repeats)
+    cached_time = timeit(lambda: [convert_date(date) for date in valid], number=repeats)
+
+    num = repeats * len(valid)
+    print("strptime formats:     {:8.2f} us/date".format(strptime_time / num * 1e6))
+    print("compiled pattern:     {:8.2f} us/date".format(uncached_time / num * 1e6))
+    print("compiled and cached:  {:8.2f} us/date".format(cached_time / num * 1e6))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
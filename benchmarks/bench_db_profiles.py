@@ -0,0 +1,73 @@
+'''
+times inserting and navigating records under each connection settings profile of DBManager.
+
+usage: python -m benchmarks.bench_db_profiles [records inserted one by one] [records inserted in bulk] [page reads]
+'''
+import logging
+import os
+import sys
+import random
+import tempfile
+from time import perf_counter
+from dbManager import DBManager
+from benchmarks.generator import generate_records
+
+
+def make_records(num):
+    '''
+    :return: list of num generated records, 5 a day
+    '''
+    return list(generate_records(num, num_days=max(1, num // 5), num_reasons=50))
+
+
+def bench_profile(profile, tmp, num_single, num_bulk, num_reads, num_record=8):
+    dm = DBManager(logging.getLogger(__name__), path=os.path.join(tmp, "{}.db".format(profile)), env_path=None,
+                   profile=profile)
+    results = {}
+
+    start = perf_counter()
+    for record in make_records(num_single):
+        dm.insert_new_withdraw(*record)
+    results["single inserts/s"] = num_single / (perf_counter() - start)
+
+    start = perf_counter()
+    dm.insert_many(make_records(num_bulk))
+    results["bulk inserts/s"] = num_bulk / (perf_counter() - start)
+
+    rand = random.Random(0)
+    last_id = num_single + num_bulk
+    start = perf_counter()
+    for _ in range(num_reads):
+        dm.get_records_after_id(rand.randint(num_record, last_id), num_record)
+    results["id pages/s"] = num_reads / (perf_counter() - start)
+
+    dates = [record[0] for record in make_records(num_bulk)]
+    start = perf_counter()
+    for _ in range(num_reads):
+        date_s = rand.choice(dates)
+        dm.get_withdraws_before_date(date_s, num_record)
+        dm.get_monthly_total(date_s)
+    results["date pages/s"] = num_reads / (perf_counter() - start)
+
+    dm.__del__()
+    return results
+
+
+def main():
+    num_single = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    num_bulk = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    num_reads = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+    os.environ.setdefault("CURRENT_DB_TABLE", "General")
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = [(profile, bench_profile(profile, tmp, num_single, num_bulk, num_reads))
+                for profile in DBManager.__profiles__]
+
+    columns = list(rows[0][1])
+    print("{:10}".format("profile") + "".join("{:>18}".format(column) for column in columns))
+    for profile, results in rows:
+        print("{:10}".format(profile) + "".join("{:18.0f}".format(results[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+'''
+compares the streaming DBManager.excel_to_db against the previous importer, which loaded the whole workbook and
+inserted record by record, on a generated multi-year workbook.
+
+usage: python -m benchmarks.bench_excel_import [years] [records per day]
+'''
+import logging
+import os
+import sys
+import tempfile
+from time import perf_counter
+from datetime import date
+from openpyxl import load_workbook
+from dbManager import DBManager
+from benchmarks.generator import generate_records, generate_workbook
+
+
+def generate_budget(path, years=5, records_per_day=3, first_year=2017):
+    '''
+    writes a generated budget of years whole years as a workbook
+    :return: number of records written
+    '''
+    num_days = (date(first_year + years, 1, 1) - date(first_year, 1, 1)).days
+    return generate_workbook(path, generate_records(num_days * records_per_day, first_date=date(first_year, 1, 1),
+                                                    num_days=num_days))
+
+
+def legacy_excel_to_db(dm, file_path):
+    '''
+    the importer excel_to_db replaced, kept for comparison
+    '''
+    table_name = os.path.splitext(os.path.split(file_path)[1])[0]
+    dm.set_table_in_use(table_name)
+
+    wb = load_workbook(filename=file_path, data_only=True)
+    ws = wb.active
+
+    with dm.get_db_conn() as conn:
+        c = conn.cursor()
+        for idx_col, col in enumerate(ws.columns):
+            if dm._is_date(col[0].value):
+                for idx_row, cell in enumerate(col[1:]):
+                    if cell.value:
+                        year = str(col[0].value.split()[0])
+                        month = str(dm._month_to_number(col[0].value.split()[1]))
+                        day = str(cell.value)
+                        day = day if len(day) == 2 else "0" + day
+                        date = "-".join([year, month, day])
+                        amount = ws.cell(row=idx_row+2, column=idx_col+2).value
+                        if amount:
+                            reason = ws.cell(row=idx_row+2, column=idx_col+4).value
+                            if reason:
+                                c.execute('''INSERT INTO {} (date, reason, amount) VALUES (?, ?, ?)'''
+                                          .format(dm.__table__), (date, reason, amount))
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    records_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("CURRENT_DB_TABLE", "General")
+        dm = DBManager(logging.getLogger(__name__), path=os.path.join(tmp, "bench.db"), env_path=None)
+
+        num_records = generate_budget(os.path.join(tmp, "Legacy.xlsx"), years, records_per_day)
+        generate_budget(os.path.join(tmp, "Streaming.xlsx"), years, records_per_day)
+        print("workbook: {} years, {} records".format(years, num_records))
+
+        start = perf_counter()
+        legacy_excel_to_db(dm, os.path.join(tmp, "Legacy.xlsx"))
+        legacy = perf_counter() - start
+        legacy_rows = dm.get_num_records()
+
+        start = perf_counter()
+        streaming_rows = dm.excel_to_db(os.path.join(tmp, "Streaming.xlsx"))
+        streaming = perf_counter() - start
+
+        print("legacy importer:    {:8.3f}s {} records".format(legacy, legacy_rows))
+        print("streaming importer: {:8.3f}s {} records".format(streaming, streaming_rows))
+        print("speedup: {:.1f}x".format(legacy / streaming))
+        dm.__del__()
+
+
+if __name__ == "__main__":
+    main()
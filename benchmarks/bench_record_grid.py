@@ -0,0 +1,80 @@
+'''
+times rendering a page of records by destroying and recreating every label, as the app used to, against updating the
+labels of a RecordGrid. Needs a display, run it headless with e.g. xvfb-run.
+
+usage: python -m benchmarks.bench_record_grid [records displayed] [renders]
+'''
+import sys
+from time import perf_counter
+from tkinter import Tk, Frame, Label, TclError, W
+from recordGrid import RecordGrid
+
+
+def recreate_labels(frame, records, num_rows):
+    '''
+    the rendering RecordGrid replaced, kept for comparison
+    '''
+    for widget in frame.winfo_children():
+        widget.destroy()
+
+    total = 0
+    for index, record in enumerate(records):
+        Label(frame, text=record[1], fg="black", bg="white").grid(row=index, padx=5, sticky=W)
+        Label(frame, text=record[2], fg="black", bg="white").grid(row=index, column=1, padx=5, sticky=W)
+        Label(frame, text=record[3], fg="black", bg="white").grid(row=index, column=2, padx=5, sticky=W)
+        total += float(record[3])
+
+    for i in range(len(records), num_rows):
+        Label(frame, text="", fg="black", bg="white").grid(row=i, padx=5, sticky=W)
+        Label(frame, text="", fg="black", bg="white").grid(row=i, column=1, padx=5, sticky=W)
+        Label(frame, text="", fg="black", bg="white").grid(row=i, column=2, padx=5, sticky=W)
+
+    Label(frame, text="Total: {:.2f}".format(total), fg="black", bg="white", borderwidth=2, relief="ridge")\
+        .grid(row=num_rows, pady=5, sticky=W)
+    Label(frame, text="Monthly Total: {:.2f}".format(0), fg="black", bg="white", borderwidth=2, relief="ridge")\
+        .grid(row=num_rows, column=1, pady=5, sticky=W)
+
+
+def time_renders(window, render, pages):
+    start = perf_counter()
+    for records in pages:
+        render(records)
+        window.update_idletasks()
+    return (perf_counter() - start) / len(pages)
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    renders = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    try:
+        window = Tk()
+    except TclError as e:
+        print("no display available ({}), run under xvfb-run".format(e))
+        return 1
+    window.withdraw()
+
+    pages = [[(id, "2018-01-{:02d}".format(id % 28 + 1), "reason {}".format(id), id * 1.5)
+              for id in range(page + num_rows, page, -1)] for page in range(renders)]
+    # every few pages is a partial page, as at the start of a budget
+    pages = [records[:num_rows // 2] if idx % 5 == 0 else records for idx, records in enumerate(pages)]
+
+    frame = Frame(window)
+    frame.pack()
+    before = time_renders(window, lambda records: recreate_labels(frame, records, num_rows), pages)
+    frame.destroy()
+
+    frame = Frame(window)
+    frame.pack()
+    grid = RecordGrid(frame, num_rows)
+    after = time_renders(window, lambda records: grid.display(records, sum(r[3] for r in records)), pages)
+    window.destroy()
+
+    print("{} rows, {} renders".format(num_rows, renders))
+    print("recreating labels: {:8.3f} ms/render".format(before * 1e3))
+    print("record grid:       {:8.3f} ms/render".format(after * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
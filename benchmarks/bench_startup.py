@@ -0,0 +1,76 @@
+'''
+times cold startup: importing the main modules, each in a fresh interpreter, and the time from starting the
+interpreter to the first drawn window of the app. The window needs a display, run it headless with e.g. xvfb-run.
+The app is started on a db and budgets folder in a temporary directory, the real budgets are not touched.
+
+usage: python -m benchmarks.bench_startup [runs per measurement]
+'''
+import os
+import sys
+import subprocess
+from statistics import median
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+IMPORT_SNIPPET = '''
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(perf_counter() - start)
+'''
+
+# the same steps as main.main, stopping as soon as the window has been drawn once. .env is only read, the budget in
+# use is not written back to it
+WINDOW_SNIPPET = '''
+from time import perf_counter
+start = perf_counter()
+import os
+import logging
+import tempfile
+from tkinter import TclError
+from dotenv import load_dotenv
+load_dotenv(".env")
+from app import App
+with tempfile.TemporaryDirectory() as tmp:
+    try:
+        budgetPy = App(logging.getLogger("bench_startup"), db_path=os.path.join(tmp, "bench.db"), env_path=None,
+                       budgets_path=os.path.join(tmp, "budgets"))
+    except TclError as e:
+        raise SystemExit("no display available ({}), run under xvfb-run".format(e))
+    budgetPy.window.update()
+    print(perf_counter() - start)
+    budgetPy.quit()
+'''
+
+
+def time_snippet(snippet, runs):
+    '''
+    runs a snippet that prints its own elapsed seconds in a new interpreter each time
+    :param snippet: the python source to run
+    :param runs: number of interpreters to start
+    :return: the median of the printed times in seconds
+    '''
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return median(times)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for module in ("dbManager", "cli", "app"):
+        print("import {:10} {:8.1f} ms".format(module, time_snippet(IMPORT_SNIPPET.format(module=module), runs) * 1e3))
+
+    try:
+        print("first window       {:8.1f} ms".format(time_snippet(WINDOW_SNIPPET, runs) * 1e3))
+    except RuntimeError as e:
+        print("first window: {}".format(e))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
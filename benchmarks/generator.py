@@ -0,0 +1,94 @@
+'''
+generates synthetic budgets of a configurable size for the benchmarks, as a table of a DBManager database and as a
+workbook in the layout DBManager.excel_to_db expects. The same arguments and seed always give the same budget.
+'''
+import random
+from datetime import date, timedelta
+from itertools import groupby, islice
+from dbManager import DBManager
+
+# whether a day has no records, given the day and the generator's random.Random
+GAP_PATTERNS = {
+    "none": lambda day, rand: False,
+    "weekends": lambda day, rand: day.weekday() >= 5,
+    "months": lambda day, rand: day.month % 4 == 0,  # every fourth month has no records
+    "random": lambda day, rand: rand.random() < 0.3,
+}
+
+
+def generate_records(num_records, first_date=date(2017, 1, 1), num_days=3650, gaps="none", num_reasons=200, seed=0):
+    '''
+    :param num_records: number of records generated
+    :param first_date: date of the first record, excel_to_db only imports months from 2017 on
+    :param num_days: number of days the records are spread over, starting from first_date
+    :param gaps: name of a GAP_PATTERNS entry, days it matches get no records
+    :param num_reasons: number of distinct reasons
+    :param seed: seed of the random amounts, reasons and random gaps
+    :return: generator of (date str, reason, amount) in date order
+    '''
+    rand = random.Random(seed)
+    is_gap = GAP_PATTERNS[gaps]
+    days = [first_date + timedelta(days=i) for i in range(num_days)]
+    days = [day.isoformat() for day in days if not is_gap(day, rand)]
+    if not days:
+        raise ValueError("gap pattern {} leaves no days in {} days".format(gaps, num_days))
+
+    reasons = ["reason {}".format(i) for i in range(num_reasons)]
+    for i in range(num_records):
+        # records are spread evenly over the days, each day gets a run of records
+        yield days[i * len(days) // num_records], rand.choice(reasons), round(rand.uniform(0.5, 300), 2)
+
+
+def generate_table(dm, table, records, batch_size=50000):
+    '''
+    :param dm: DBManager the table is created in, it is left in use
+    :param table: name of the table, any existing records in it are kept
+    :param records: iterable of (date, reason, amount)
+    :param batch_size: number of records per insert_many
+    :return: number of records inserted
+    '''
+    dm.set_table_in_use(table)
+    records = iter(records)
+    inserted = 0
+    batch = list(islice(records, batch_size))
+    while batch:
+        dm.insert_many(batch)
+        inserted += len(batch)
+        batch = list(islice(records, batch_size))
+    dm.flush()
+    return inserted
+
+
+def generate_workbook(path, records):
+    '''
+    writes the records as a workbook in the layout excel_to_db expects, a Date / Amount / _ / Reason / _ / Sum / _
+    block of columns per month, the header of the date column is the month, e.g. "2018 Aug"
+    :param path: path of the .xlsx file, its name is the table excel_to_db imports into
+    :param records: iterable of (date, reason, amount) in date order
+    :return: number of records written
+    '''
+    from openpyxl import Workbook
+
+    columns = []
+    for month, month_records in groupby(records, key=lambda record: record[0][:7]):
+        header = " ".join([month[:4], DBManager._number_to_month(int(month[5:7]))])
+        days, amounts, reasons = [header], ["Amount"], ["Reason"]
+        for date_s, reason, amount in month_records:
+            days.append(int(date_s[8:10]))
+            amounts.append(amount)
+            reasons.append(reason)
+        columns.append((days, amounts, reasons))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    num_rows = max((len(days) for days, _, _ in columns), default=0)
+    for idx_row in range(num_rows):
+        row = []
+        for days, amounts, reasons in columns:
+            if idx_row < len(days):
+                row += [days[idx_row], amounts[idx_row], None, reasons[idx_row], None, None, None]
+            else:
+                row += [None] * 7
+        ws.append(row)
+    wb.save(path)
+    return sum(len(days) - 1 for days, _, _ in columns)
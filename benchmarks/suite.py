@@ -0,0 +1,193 @@
+'''
+times the DBManager and App hot paths on generated budgets of each given size and writes the results as JSON, so
+runs on different commits or machines can be compared.
+
+_jump_to_date needs a window, so what is timed is the work it does off the tk thread: parsing the date, then the
+page and monthly total read through the RecordCache, as App._navigate does.
+
+usage: python -m benchmarks.suite [--rows 10000 100000 ...] [--output results.json] [see --help for the rest]
+'''
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from statistics import mean, median
+from time import perf_counter
+from dbManager import DBManager
+from recordCache import RecordCache
+from benchmarks.generator import GAP_PATTERNS, generate_records, generate_table, generate_workbook
+
+# every form App._convert_date accepts, as typed in the date fields
+DATE_FORMS = ["{:%Y-%m-%d}", "{:%Y-%-m-%-d}", "{:%y-%m-%d}", "{:%y-%-m-%-d}", "{:%Y-%b-%d}", "{:%y-%B-%-d}"]
+
+
+def summarize(name, rows, times):
+    '''
+    :param name: name of the benchmark
+    :param rows: number of records in the budget
+    :param times: seconds taken by each operation
+    :return: dict of the result, as written to the JSON output
+    '''
+    ordered = sorted(times)
+    return {
+        "benchmark": name,
+        "rows": rows,
+        "ops": len(times),
+        "total_s": sum(times),
+        "ops_per_s": len(times) / sum(times) if sum(times) else None,
+        "mean_ms": mean(times) * 1e3,
+        "p50_ms": median(times) * 1e3,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+def time_each(fn, args_list):
+    times = []
+    for args in args_list:
+        start = perf_counter()
+        fn(*args)
+        times.append(perf_counter() - start)
+    return times
+
+
+def bench_queries(dm, rows, dates, ops, cache_size, rand):
+    '''
+    :param dm: DBManager with the generated table in use
+    :param rows: number of records in the table
+    :param dates: every date that has records
+    :param ops: number of calls timed per benchmark
+    :param cache_size: size of the RecordCache in front of the _jump_to_date reads, as RECORDS_CACHE_SIZE
+    :param rand: random.Random the arguments are drawn from
+    :return: list of results
+    '''
+    from app import App
+
+    num_record = int(os.environ.get("RECORDS_DISPLAYED", 8))
+    results = []
+
+    args = [(rand.choice(dates),) for _ in range(ops)]
+    results.append(summarize("get_withdraw", rows, time_each(dm.get_withdraw, args)))
+
+    args = [(rand.randint(1, rows), num_record) for _ in range(ops)]
+    results.append(summarize("get_records_after_id", rows, time_each(dm.get_records_after_id, args)))
+
+    args = [(rand.choice(dates),) for _ in range(ops)]
+    results.append(summarize("get_monthly_total", rows, time_each(dm.get_monthly_total, args)))
+
+    records = RecordCache(dm, cache_size)
+
+    def jump_to_date(date_s):
+        date_s = App._convert_date(date_s)
+        page = records.get_withdraws_before_date(date_s, num_record)
+        return page, dm.get_monthly_total(page[0][1]) if page else 0
+
+    # dates are typed in any of the accepted forms, anywhere in the span of the budget
+    first, last = datetime.strptime(dates[0], "%Y-%m-%d"), datetime.strptime(dates[-1], "%Y-%m-%d")
+    typed = [rand.choice(DATE_FORMS).format(first + timedelta(days=rand.randint(0, (last - first).days)))
+             for _ in range(ops)]
+    results.append(summarize("_jump_to_date", rows, time_each(jump_to_date, [(date_s,) for date_s in typed])))
+    results[-1]["cache"] = records.stats()
+    return results
+
+
+def bench_convert_date(ops, rand):
+    from app import App
+
+    days = [date(2000, 1, 1) + timedelta(days=rand.randint(0, 365 * 30)) for _ in range(ops)]
+    typed = [(rand.choice(DATE_FORMS).format(day),) for day in days]
+    return summarize("_convert_date", None, time_each(App._convert_date, typed))
+
+
+def bench_excel(dm, tmp, records, repeat):
+    '''
+    :param dm: DBManager, the table in use is changed to the imported one
+    :param tmp: directory the workbooks are written to
+    :param records: list of (date, reason, amount) the workbook is generated from
+    :param repeat: number of imports and exports timed
+    :return: list of results
+    '''
+    imports, exports = [], []
+    for idx in range(repeat):
+        path = os.path.join(tmp, "Excel{}.xlsx".format(idx))
+        generate_workbook(path, records)
+        start = perf_counter()
+        dm.excel_to_db(path)
+        imports.append(perf_counter() - start)
+
+        start = perf_counter()
+        dm.db_to_excel(os.path.join(tmp, "Export{}.xlsx".format(idx)))
+        exports.append(perf_counter() - start)
+    return [summarize("excel_to_db", len(records), imports), summarize("db_to_excel", len(records), exports)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.dirname(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DBManager and App hot paths on generated budgets")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="budget sizes, 10k to 10M")
+    parser.add_argument("--days", type=int, default=3650, help="number of days the records are spread over")
+    parser.add_argument("--gaps", choices=sorted(GAP_PATTERNS), default="none", help="days without records")
+    parser.add_argument("--reasons", type=int, default=200, help="number of distinct reasons")
+    parser.add_argument("--ops", type=int, default=2000, help="calls timed per query benchmark")
+    parser.add_argument("--excel-rows", type=int, default=100000,
+                        help="budgets larger than this skip the excel benchmarks, 0 to always skip them")
+    parser.add_argument("--repeat", type=int, default=1, help="imports and exports timed per budget")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file the JSON is written to, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("CURRENT_DB_TABLE", "General")
+    rand = random.Random(args.seed)
+    results = [bench_convert_date(args.ops, rand)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            dm = DBManager(logging.getLogger(__name__), path=os.path.join(tmp, "bench{}.db".format(rows)),
+                           env_path=None)
+            generator_args = dict(num_days=args.days, gaps=args.gaps, num_reasons=args.reasons, seed=args.seed)
+
+            start = perf_counter()
+            generate_table(dm, "Generated", generate_records(rows, **generator_args))
+            print("generated {} records in {:.1f}s".format(rows, perf_counter() - start), file=sys.stderr)
+
+            with dm.get_db_conn(write=False) as conn:
+                dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM Generated ORDER BY date")]
+            results += bench_queries(dm, rows, dates, args.ops, int(os.environ.get("RECORDS_CACHE_SIZE", 32)), rand)
+
+            if rows <= args.excel_rows:
+                results += bench_excel(dm, tmp, list(generate_records(rows, **generator_args)), args.repeat)
+            dm.__del__()
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
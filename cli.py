@@ -0,0 +1,187 @@
+'''
+command line access to budgets, without tkinter. Records are read from stdin and results written to stdout as csv.
+
+usage:
+    python cli.py [--table TABLE] [--db PATH] ingest [--format csv|ndjson] [--batch-size N] < records
+    python cli.py [--table TABLE] range START END
+    python cli.py [--table TABLE] totals YEAR
+    python cli.py [--table TABLE] export (--excel PATH | --snapshot PATH)
+    python cli.py import-excel [--workers N] PATH [PATH ...]
+    python cli.py all-totals YEAR
+    python cli.py all-range-totals START END
+
+ingest takes date,reason,amount csv rows, an optional date,reason,amount header is skipped, or ndjson lines that are
+either {"date": ..., "reason": ..., "amount": ...} objects or [date, reason, amount] arrays. The all- commands report
+on every budget of the db, whatever the table. import-excel imports each workbook into the table named after it, and
+writes a path,table,records,error csv row per workbook.
+'''
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+from dotenv import load_dotenv
+from dbManager import DBManager
+from consolidatedReport import ConsolidatedReport
+
+
+def read_csv(stream):
+    for idx, row in enumerate(csv.reader(stream)):
+        if not row:
+            continue
+        if idx == 0 and [field.strip().lower() for field in row] == ["date", "reason", "amount"]:
+            continue
+        if len(row) != 3:
+            raise ValueError("line {}: expected date, reason and amount".format(idx + 1))
+        yield row
+
+
+def read_ndjson(stream):
+    for idx, line in enumerate(stream):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record, dict):
+            record = [record.get("date"), record.get("reason"), record.get("amount")]
+        if len(record) != 3:
+            raise ValueError("line {}: expected date, reason and amount".format(idx + 1))
+        yield [str(field) if field is not None else "" for field in record]
+
+
+def ingest(dm, args):
+    records = read_ndjson(sys.stdin) if args.format == "ndjson" else read_csv(sys.stdin)
+    inserted, batch = 0, []
+    for record in records:
+        batch.append(record)
+        if len(batch) == args.batch_size:
+            inserted += insert_batch(dm, batch, inserted)
+            batch = []
+    if batch:
+        inserted += insert_batch(dm, batch, inserted)
+    print("inserted {} records into {}".format(inserted, dm.__table__), file=sys.stderr)
+
+
+def insert_batch(dm, batch, inserted):
+    try:
+        return len(dm.insert_many(batch))
+    except ValueError as e:
+        raise ValueError("in the batch starting at record {}, {}".format(inserted + 1, str(e)))
+
+
+def date_range(dm, args):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["id", "date", "reason", "amount"])
+    writer.writerows(dm.get_withdraws_in_range(dm._convert_date(args.start), dm._convert_date(args.end)))
+
+
+def totals(dm, args):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["month", "total", "count", "min", "max"])
+    writer.writerows(dm.get_monthly_totals(args.year))
+
+
+def all_totals(dm, args):
+    monthly = ConsolidatedReport(dm).monthly_totals("{}-01".format(args.year), "{}-12".format(args.year))
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["budget", "month", "total", "count"])
+    for budget in sorted(monthly):
+        writer.writerows([budget] + list(row) for row in monthly[budget])
+
+
+def all_range_totals(dm, args):
+    ranges = ConsolidatedReport(dm).range_totals(dm._convert_date(args.start), dm._convert_date(args.end))
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["budget", "total", "count"])
+    writer.writerows([budget] + list(ranges[budget]) for budget in sorted(ranges))
+
+
+def export(dm, args):
+    if args.excel:
+        dm.db_to_excel(os.path.abspath(args.excel))
+    else:
+        dm.db_to_snapshot(os.path.abspath(args.snapshot))
+
+
+def import_excel(dm, args):
+    def progress(done, total, *records):
+        # only once per workbook, not after every batch of its records
+        if not records:
+            print("{} of {} workbooks".format(done, total), file=sys.stderr)
+
+    results = dm.excels_to_db([os.path.abspath(path) for path in args.paths], workers=args.workers, progress=progress)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["path", "table", "records", "error"])
+    writer.writerows(results)
+    if any(error for _, _, _, error in results):
+        raise ValueError("{} of {} workbooks failed to import".format(
+            sum(1 for _, _, _, error in results if error), len(results)))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="BudgetPy without the window")
+    parser.add_argument("--table", help="budget to use, defaults to CURRENT_DB_TABLE in .env")
+    parser.add_argument("--db", help="sqlite db to use, defaults to the db of the current user")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    parser_ingest = commands.add_parser("ingest", help="insert records read from stdin")
+    parser_ingest.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser_ingest.add_argument("--batch-size", type=int, default=5000, help="records inserted per transaction")
+    parser_ingest.set_defaults(run=ingest)
+
+    parser_range = commands.add_parser("range", help="records dated from START to END, both included")
+    parser_range.add_argument("start")
+    parser_range.add_argument("end")
+    parser_range.set_defaults(run=date_range)
+
+    parser_totals = commands.add_parser("totals", help="monthly totals of a year")
+    parser_totals.add_argument("year", type=int)
+    parser_totals.set_defaults(run=totals)
+
+    parser_all_totals = commands.add_parser("all-totals", help="monthly totals of a year of every budget")
+    parser_all_totals.add_argument("year", type=int)
+    parser_all_totals.set_defaults(run=all_totals)
+
+    parser_all_range = commands.add_parser("all-range-totals",
+                                           help="totals of every budget from START to END, both included")
+    parser_all_range.add_argument("start")
+    parser_all_range.add_argument("end")
+    parser_all_range.set_defaults(run=all_range_totals)
+
+    parser_import = commands.add_parser("import-excel", help="import workbooks, each into the table named after it")
+    parser_import.add_argument("paths", nargs="+", metavar="PATH")
+    parser_import.add_argument("--workers", type=int,
+                               help="processes parsing workbooks, defaults to IMPORT_WORKERS or the number of cores")
+    parser_import.set_defaults(run=import_excel)
+
+    parser_export = commands.add_parser("export", help="export the budget")
+    destination = parser_export.add_mutually_exclusive_group(required=True)
+    destination.add_argument("--excel", metavar="PATH")
+    destination.add_argument("--snapshot", metavar="PATH")
+    parser_export.set_defaults(run=export)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    load_dotenv(os.path.join(os.path.dirname(os.path.realpath(__file__)), '.env'))
+
+    logger = logging.getLogger(__name__)
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.WARNING)
+
+    # the cli never changes the budget the app opens with
+    dm = DBManager(logger, path=args.db, env_path=None, table=args.table)
+    try:
+        args.run(dm, args)
+    except (ValueError, RuntimeError) as e:
+        print("error: {}".format(str(e)), file=sys.stderr)
+        return 1
+    finally:
+        dm.__del__()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
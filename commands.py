@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from collections import deque
 
 
 class CommandFactory(object):
@@ -15,9 +15,108 @@ class CommandFactory(object):
         return command_class(app=self.app, *args, **kwargs)
 
 
+class CommandHistory(object):
+    '''
+    bounded history of executed commands, the oldest commands are dropped once capacity is reached. Commands are
+    addressed by absolute positions, that keep counting up as old commands are dropped, so membership and the previous
+    command of the same type are found without walking the history
+    '''
+    __slots__ = ("capacity", "merge_navigation", "commands", "prev_of_same_type", "start", "idx", "by_type",
+                 "members")
+
+    def __init__(self, capacity=100, merge_navigation=False):
+        self.capacity = capacity
+        # consecutive commands of a mergeable type, e.g. JumpToDate, replace each other instead of piling up
+        self.merge_navigation = merge_navigation
+        self.commands = deque()
+        self.prev_of_same_type = deque()  # position of the previous command of the same type, for each command
+        self.start = 0  # position of the oldest command kept
+        self.idx = 0  # position after the last executed command, the commands from here on can be redone
+        self.by_type = {}  # type -> deque of the positions of its commands
+        self.members = set()
+
+    def __contains__(self, command):
+        return command in self.members
+
+    def __len__(self):
+        return len(self.commands)
+
+    def _end(self):
+        return self.start + len(self.commands)
+
+    def _pop(self):
+        command = self.commands.pop()
+        self.prev_of_same_type.pop()
+        self.by_type[type(command)].pop()
+        self.members.discard(command)
+
+    def push(self, command):
+        # whenever a new command is issued, throw away anything in the history after the current position
+        while self._end() > self.idx:
+            self._pop()
+
+        if self.merge_navigation and command.mergeable and self.commands and type(self.commands[-1]) is type(command):
+            self._pop()
+            self.idx -= 1
+
+        positions = self.by_type.setdefault(type(command), deque())
+        self.prev_of_same_type.append(positions[-1] if positions else None)
+        positions.append(self._end())
+        self.commands.append(command)
+        self.members.add(command)
+        self.idx += 1
+
+        while len(self.commands) > self.capacity:
+            dropped = self.commands.popleft()
+            self.prev_of_same_type.popleft()
+            self.by_type[type(dropped)].popleft()
+            self.members.discard(dropped)
+            self.start += 1
+
+    def get(self, position):
+        return self.commands[position - self.start] if self.start <= position < self._end() else None
+
+    def undo(self):
+        '''
+        :return: the last executed command, which is then no longer counted as executed, none if there is none
+        '''
+        if self.idx > self.start:
+            self.idx -= 1
+            return self.get(self.idx)
+        return None
+
+    def redo(self):
+        '''
+        :return: the next command to redo, which is then counted as executed, none if there is none
+        '''
+        if self.idx < self._end():
+            self.idx += 1
+            return self.get(self.idx - 1)
+        return None
+
+    def get_prev_command_of_type(self, command_class):
+        '''
+        :return: the last command of exactly the given type executed before the last executed command, none if there is
+        none
+        '''
+        current = self.idx - 1
+        if current < self.start:
+            return None
+
+        if type(self.get(current)) is command_class:
+            position = self.prev_of_same_type[current - self.start]
+        else:
+            # walk back from the newest command of the type, past the ones that can be redone
+            positions = self.by_type.get(command_class, ())
+            position = next((p for p in reversed(positions) if p < current), None)
+        return self.get(position) if position is not None else None
+
+
 class Command(object):
-    history = []
-    history_idx = 0
+    __slots__ = ("app",)
+    history = CommandHistory()
+    # whether consecutive commands of this type may be merged in the history
+    mergeable = False
 
     def __init__(self, app, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -26,41 +125,32 @@ class Command(object):
     def execute(self):
         # this happens when we call execute directly, instead of the redo method calling execute
         if self not in Command.history:
-            # this means that whenever a new command is issued, we through away anything in the command history after
-            # the command where the history idx is pointing to currently
-            Command.history = Command.history[:Command.history_idx]
-            Command.history.append(self)
-            Command.history_idx += 1
+            Command.history.push(self)
 
     def unexecute(self):
         raise NotImplementedError
 
     @staticmethod
     def undo():
-        if Command.history_idx > 0:
-            Command.history[Command.history_idx-1].unexecute()  # minus one because idx is initialized to 0 while
-            # history is empty, meaning it is actually one less than the actual index for the history list
-            Command.history_idx -= 1
+        command = Command.history.get(Command.history.idx - 1)
+        if command:
+            command.unexecute()
+            Command.history.undo()
 
     @staticmethod
     def redo():
-        if Command.history_idx < len(Command.history):
-            Command.history_idx += 1
-            Command.history[Command.history_idx-1].execute()
+        command = Command.history.redo()
+        if command:
+            command.execute()
 
     @staticmethod
     def get_prev_command_of_type(command_class):
-        idx = Command.history_idx - 1
-        last_command = None
-        while idx > 0:
-            if isinstance(Command.history[idx-1], command_class):
-                last_command = Command.history[idx-1]
-                break
-            idx -= 1
-        return last_command
+        return Command.history.get_prev_command_of_type(command_class)
 
 
 class EnterRecord(Command):
+    __slots__ = ("date", "reason", "amount", "id")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -71,13 +161,15 @@ class EnterRecord(Command):
             self.amount = app._convert_amount(app.new_record_amount.get())
         except ValueError as e:
             raise ValueError(str(e))
+        # set when the record is first inserted, redo inserts it again with the same id
+        self.id = None
 
     def execute(self):
         super().execute()
 
         app = self.app
         try:
-            app.dm.insert_new_withdraw(self.date, self.reason, self.amount)
+            self.id = app.dm.insert_new_withdraw(self.date, self.reason, self.amount, self.id)
             app.set_record_fields(app.get_today_date(), "", "")
         except Exception as e:
             app.alert("Error while adding record to database: {}".format(str(e)))
@@ -87,7 +179,7 @@ class EnterRecord(Command):
         last_command = Command.get_prev_command_of_type(EnterRecord)
 
         try:
-            app.dm.delete_widthraw(self.date, self.reason, self.amount)
+            app.dm.delete_records([self.id])
             if last_command:
                 app.set_record_fields(last_command.date, last_command.reason, last_command.amount)
             else:
@@ -96,7 +188,45 @@ class EnterRecord(Command):
             app.alert("Error while removing record from database: {}".format(str(e)))
 
 
+class EnterRecords(Command):
+    __slots__ = ("records", "ids")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        app = self.app
+        try:
+            self.records = app.dm.convert_records(app._parse_records_text(app.get_new_records_text()))
+        except ValueError as e:
+            raise ValueError(str(e))
+        if not self.records:
+            raise ValueError("there are no records to enter")
+        self.ids = []
+
+    def execute(self):
+        super().execute()
+
+        app = self.app
+        try:
+            self.ids = app.dm.insert_many(self.records, self.ids)
+            app.clear_new_records_text()
+            app.reload_records()
+        except Exception as e:
+            app.alert("Error while adding records to database: {}".format(str(e)))
+
+    def unexecute(self):
+        app = self.app
+        try:
+            app.dm.delete_records(self.ids)
+            app.reload_records()
+        except Exception as e:
+            app.alert("Error while removing records from database: {}".format(str(e)))
+
+
 class JumpToDate(Command):
+    __slots__ = ("num_record", "date")
+    mergeable = True
+
     def __init__(self, num_record=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -123,6 +253,9 @@ class JumpToDate(Command):
 
 
 class JumpToMonth(Command):
+    __slots__ = ("num_record", "year_month")
+    mergeable = True
+
     def __init__(self, num_record=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -0,0 +1,223 @@
+'''
+totals over every budget of the database at once, for household-wide reports.
+'''
+import threading
+from datetime import datetime, timedelta
+from dbManager import DBManager, __date_format__
+
+# tables created along with every budget table, as suffixes of its name
+__derived_suffixes__ = ("_monthly", "_search", "_search_data", "_search_idx", "_search_docsize", "_search_config",
+                        "_search_content")
+
+
+class ConsolidatedReport(object):
+    '''
+    reports over all the budget tables of a DBManager's database, whichever table is in use. Every cross-budget
+    total is answered with one statement, a UNION ALL of a part per budget, instead of a query per budget.
+
+    Results are cached per budget table and key, and the cache of a table is dropped whenever records are inserted
+    into or deleted from it through the DBManager. A report only queries the budgets that are not cached. Writes by
+    other processes, e.g. cli.py, are not seen until the budget is written to by this one
+    '''
+    view = "all_budgets"
+
+    def __init__(self, dm, max_entries=64, *args, **kwargs):
+        '''
+        :param dm: DBManager whose database is reported on
+        :param max_entries: number of results cached per budget table, the oldest are dropped first
+        '''
+        super().__init__(*args, **kwargs)
+        self.dm = dm
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache = {}  # table -> {key: result}
+        # table -> number of writes, results computed while the table was written to are not cached
+        self._generations = {}
+
+        dm.add_write_listener(self._invalidate)
+
+    def _invalidate(self, table=None):
+        with self._lock:
+            tables = list(self._cache) if table is None else [table]
+            for table in tables:
+                self._cache.pop(table, None)
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def get_budget_tables(self, c=None):
+        '''
+        :param c: cursor, if none, a read unit is opened
+        :return: names of the budget tables in the database in name order, without the monthly summaries, the
+        search indexes and the tables sqlite keeps for itself
+        '''
+        if c is None:
+            with self.dm.get_db_conn(write=False) as conn:
+                return self.get_budget_tables(conn.cursor())
+
+        c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+                     ORDER BY name''')
+        names = [row[0] for row in c.fetchall()]
+        tables = set(names)
+        return [name for name in names if not any(name.endswith(suffix) and name[:-len(suffix)] in tables
+                                                  for suffix in __derived_suffixes__)]
+
+    def _get_view_sql(self, tables):
+        return '''CREATE VIEW {} AS {}'''.format(self.view, " UNION ALL ".join(
+            '''SELECT '{0}' AS budget, id, date, reason, amount FROM {0}'''.format(table) for table in tables))
+
+    def create_view(self):
+        '''
+        (re)creates the all_budgets view of the records of every budget, with their budget as the first column, if
+        the budgets changed since it was created. sqlite pushes conditions on the view down into each budget, so
+        they still use the indexes of the budget tables
+        :return: name of the view
+        '''
+        with self.dm.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            tables = self.get_budget_tables(c)
+            c.execute('''SELECT sql FROM sqlite_master WHERE type='view' AND name=?''', (self.view,))
+            row = c.fetchone()
+        sql = self._get_view_sql(tables)
+        if row and row[0] == sql:
+            return self.view
+
+        with self.dm.get_db_conn() as conn:
+            c = conn.cursor()
+            c.execute('''DROP VIEW IF EXISTS {}'''.format(self.view))
+            c.execute(sql)
+        self.dm.flush()
+        return self.view
+
+    def _query(self, key, part, params):
+        '''
+        :param key: key of the result in the cache of each budget
+        :param part: function of a budget table and whether it has a monthly summary, returning the SELECT of the
+        budget's rows, the budget's name is the first column
+        :param params: named parameters of the parts
+        :return: budget table -> list of rows of the budget, without the budget's name, for every budget
+        '''
+        with self.dm.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            tables = self.get_budget_tables(c)
+            with self._lock:
+                results = {table: self._cache[table][key] for table in tables
+                           if key in self._cache.get(table, {})}
+                generations = {table: self._generations.get(table, 0) for table in tables}
+            missing = [table for table in tables if table not in results]
+            if not missing:
+                return results
+
+            summarized = set(self.get_budget_tables_with_summary(c, missing))
+            c.execute(" UNION ALL ".join(part(table, table in summarized) for table in missing), params)
+            for table in missing:
+                results[table] = []
+            for row in c.fetchall():
+                results[row[0]].append(tuple(row[1:]))
+
+        with self._lock:
+            for table in missing:
+                if self._generations.get(table, 0) != generations[table]:
+                    continue
+                cache = self._cache.setdefault(table, {})
+                if len(cache) >= self.max_entries:
+                    del cache[next(iter(cache))]
+                cache[key] = results[table]
+        return results
+
+    @staticmethod
+    def get_budget_tables_with_summary(c, tables):
+        '''
+        :return: the tables that have a monthly summary, tables created before it existed only get it once used
+        '''
+        c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name IN ({})'''
+                  .format(", ".join("?" * len(tables))), [table + "_monthly" for table in tables])
+        return [row[0][:-len("_monthly")] for row in c.fetchall()]
+
+    def monthly_totals(self, first_month, last_month):
+        '''
+        :param first_month: first month included, e.g. 2018-01
+        :param last_month: last month included
+        :return: budget table -> list of (month, total, count) of the months of the budget with records, in order
+        '''
+        def part(table, summarized):
+            if summarized:
+                return '''SELECT '{0}', month, total, count FROM {0}_monthly WHERE month>=:first AND month<=:last'''\
+                    .format(table)
+            return '''SELECT '{0}', substr(date, 1, 7) AS month, SUM(amount), COUNT(*) FROM {0}
+                      WHERE date>=:first AND date<:after GROUP BY month'''.format(table)
+
+        results = self._query(("monthly", first_month, last_month), part,
+                              {"first": first_month, "last": last_month,
+                               "after": DBManager._month_range(last_month + "-01")[1]})
+        return {table: sorted(rows) for table, rows in results.items()}
+
+    def range_totals(self, start, end):
+        '''
+        :param start: date str of the first day of the range
+        :param end: date str of the last day of the range
+        :return: budget table -> (total, count) of the records of the budget dated in the range. Whole months come
+        from the monthly summaries, only the records of the months at the ends of the range are read
+        '''
+        ranges, months = self._split_range(start, end)
+        params = {}
+        for idx, (range_start, range_end) in enumerate(ranges):
+            params["start{}".format(idx)] = range_start
+            params["end{}".format(idx)] = range_end
+        if months:
+            params["first"], params["last"] = months
+            params["after"] = DBManager._month_range(months[1] + "-01")[1]
+
+        def part(table, summarized):
+            # the columns of a compound select are named by its first part, so every part names them
+            parts = ['''SELECT SUM(amount) AS total, COUNT(*) AS count FROM {0}
+                         WHERE date>=:start{1} AND date<=:end{1}'''.format(table, idx) for idx in range(len(ranges))]
+            if months and summarized:
+                parts.append('''SELECT SUM(total) AS total, SUM(count) AS count FROM {}_monthly
+                                WHERE month>=:first AND month<=:last'''.format(table))
+            elif months:
+                parts.append('''SELECT SUM(amount) AS total, COUNT(*) AS count FROM {}
+                                WHERE date>=:first AND date<:after'''.format(table))
+            return '''SELECT '{}', COALESCE(SUM(total), 0), COALESCE(SUM(count), 0) FROM ({})'''.format(
+                table, " UNION ALL ".join(parts) if parts else "SELECT 0 AS total, 0 AS count")
+
+        results = self._query(("range", start, end), part, params)
+        return {table: rows[0] for table, rows in results.items()}
+
+    @staticmethod
+    def _split_range(start, end):
+        '''
+        :return: (list of (first, last day) of the parts of the range in months it does not cover whole, (first, last)
+        month the range covers whole, none if there are none)
+        '''
+        if start > end:
+            return [], None
+        start_month, after_start = DBManager._month_range(start)
+        end_month, after_end = DBManager._month_range(end)
+        first = start[:7] if start == start_month else after_start[:7]
+        last = end[:7] if end == ConsolidatedReport._previous_day(after_end) else \
+            ConsolidatedReport._previous_day(end_month)[:7]
+        if first > last:
+            return [(start, end)], None
+
+        ranges = []
+        if start[:7] < first:
+            ranges.append((start, ConsolidatedReport._previous_day(after_start)))
+        if end[:7] > last:
+            ranges.append((end_month, end))
+        return ranges, (first, last)
+
+    @staticmethod
+    def _previous_day(date):
+        return (datetime.strptime(date, __date_format__) - timedelta(days=1)).strftime(__date_format__)
+
+    def get_records_in_range(self, start, end):
+        '''
+        :param start: date str of the first day of the range
+        :param end: date str of the last day of the range
+        :return: rows of (budget, id, date, reason, amount) of every budget dated in the range, in order of date
+        '''
+        view = self.create_view()
+        with self.dm.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT * FROM {} WHERE date>=? AND date<=? ORDER BY date, budget, id'''.format(view),
+                      (start, end))
+            return c.fetchall()
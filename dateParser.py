@@ -0,0 +1,93 @@
+import re
+import calendar
+from datetime import datetime
+from functools import lru_cache
+
+__date_format__ = "%Y-%m-%d"
+__date_formats__ = None
+
+# yy or yyyy - m, mm or month name - d or dd, in ascii only, anything else goes through the strptime formats
+__fast_date__ = re.compile(r"(\d\d|\d\d\d\d)-(\d\d?|[A-Za-z]+)-(\d\d?)", re.ASCII)
+
+
+def _get_date_formats():
+    global __date_formats__
+    if not __date_formats__:
+        year = ['%y', "%-y", "%Y"]
+        month = ['%m', "%-m", "%b", "%B"]
+        day = ['%d', "%-d"]
+        date_formats = []
+        for y in year:
+            for m in month:
+                for d in day:
+                    date_formats += [y + "-" + m + "-" + d]
+        __date_formats__ = date_formats
+    return __date_formats__
+
+
+@lru_cache(maxsize=None)
+def _month_names():
+    # the same names strptime accepts for %b and %B
+    names = {}
+    for number in range(1, 13):
+        names[calendar.month_abbr[number].lower()] = number
+        names[calendar.month_name[number].lower()] = number
+    return names
+
+
+def convert_date_strptime(date):
+    '''
+    :param date:
+    :return: convert the given date string into the desired format, by trying every accepted strptime format
+    '''
+    for fmt in _get_date_formats():
+        try:
+            return datetime.strptime(date, fmt).strftime(__date_format__)
+        except ValueError:
+            pass
+
+    raise ValueError("{} is not a recognized date".format(date))
+
+
+def _convert_date_fast(date):
+    '''
+    :return: the converted date, or None if the date is not in one of the common forms or is not a valid date
+    '''
+    match = __fast_date__.fullmatch(date)
+    if not match:
+        return None
+    year, month, day = match.groups()
+
+    if len(year) == 2:
+        # same pivot as strptime's %y
+        year = int(year) + (1900 if int(year) >= 69 else 2000)
+    else:
+        year = int(year)
+        if year < 1000:
+            return None
+
+    if month.isdigit():
+        month = int(month)
+    else:
+        month = _month_names().get(month.lower())
+        if not month:
+            return None
+
+    day = int(day)
+    if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    return "{:04d}-{:02d}-{:02d}".format(year, month, day)
+
+
+@lru_cache(maxsize=1024)
+def convert_date(date):
+    '''
+    :param date:
+    :return: convert the given date string into the desired format, same as convert_date_strptime but with a single
+    compiled pattern for the common forms and memoized
+    '''
+    if type(date) is str:
+        converted = _convert_date_fast(date)
+        if converted:
+            return converted
+    return convert_date_strptime(date)
@@ -1,69 +1,437 @@
 import sqlite3
 import os
+import re
+import tempfile
+import threading
+import time
 from datetime import datetime
 from getpass import getuser
 from contextlib import contextmanager
-from openpyxl import load_workbook, Workbook
 from dotenv import set_key
 from calendar import monthrange
-
-__date_format__ = "%Y-%m-%d"
+from snapshot import is_snapshot, read_snapshot, write_snapshot
+from fileUtils import replace_file
+from dateParser import __date_format__, convert_date
+from queryProfiler import ProfiledConnection, QueryProfiler
+from reasonIndex import ReasonIndex
 
 
 # should only instantiate this class once
 class DBManager(object):
-    __conn__ = None
+    # thread id -> connection, each thread that accesses the db gets its own connection
+    __conns__ = {}
+    __conns_lock__ = threading.Lock()
     __table__ = None
     __db_name__ = getuser()
+    # secondary indexes created on every budget table, name suffix -> indexed columns
+    __indexes__ = {
+        "date_idx": "date",
+        # covers the amounts of a date range, read by the monthly summary triggers and the range and consolidated
+        # totals without visiting the table. Records are no longer looked up by date, reason and amount
+        "withdraw_idx": "date, reason, amount",
+    }
+    # connection settings, a profile is picked with DB_PROFILE in .env and each setting can be overridden with its
+    # DB_<SETTING> key, e.g. DB_JOURNAL_MODE=DELETE. Cache size is in pages, or in KiB when negative
+    __profiles__ = {
+        # sqlite's own defaults
+        "default": {"journal_mode": "DELETE", "synchronous": "FULL", "cache_size": -2000, "mmap_size": 0,
+                    "temp_store": "DEFAULT", "statement_cache_size": 128},
+        "balanced": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -16000, "mmap_size": 64 * 2**20,
+                     "temp_store": "MEMORY", "statement_cache_size": 256},
+        # may lose the last transactions, but not corrupt the db, on power loss
+        "fast": {"journal_mode": "WAL", "synchronous": "OFF", "cache_size": -64000, "mmap_size": 256 * 2**20,
+                 "temp_store": "MEMORY", "statement_cache_size": 512},
+    }
+    __setting_values__ = {
+        "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+        "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+        "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+    }
 
-    def __init__(self, logger, *args, **kwargs):
+    def __init__(self, logger, path=None, env_path=os.path.join(os.path.dirname(__file__), '.env'), profile=None,
+                 table=None, *args, **kwargs):
+        '''
+        :param logger:
+        :param path: path of the sqlite db, if none, defaults to the db of the current user next to this file
+        :param env_path: .env file where the table in use is remembered, if none, it is not remembered
+        :param profile: name of the connection settings profile, if none, read from DB_PROFILE
+        :param table: table to use, if none, read from CURRENT_DB_TABLE
+        '''
         super().__init__(*args, **kwargs)
-        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
-                                 os.path.splitext(DBManager.__db_name__)[0] + ".db")
+        self.path = path if path else os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                                   os.path.splitext(DBManager.__db_name__)[0] + ".db")
+        self.env_path = env_path
         self.logger = logger
+        self.connection_settings = self._read_connection_settings(profile)
+        # group commit, see get_db_conn
+        self.commit_delay = int(os.environ.get("DB_COMMIT_DELAY_MS", 0)) / 1000
+        self.commit_count = 0
+        self._thread_state = threading.local()
+        self._flush_schedulers = {}
+        # callbacks called with the table name whenever records are inserted into or deleted from a table
+        self.write_listeners = []
+        # with DEBUG=1 every statement is timed, statements slower than SLOW_QUERY_MS go to the slow_queries logger
+        self.profiler = QueryProfiler(logger, logger.getChild("slow_queries"), os.environ.get("DEBUG", "0") == "1",
+                                      int(os.environ.get("SLOW_QUERY_MS", 50)))
+
+        # reasons of the latest REASON_INDEX_RECORDS records of the table in use, for suggesting reasons, only read
+        # once suggestions are asked for, so a DBManager that never suggests, e.g. the cli's, does not pay for it
+        self.reasons = ReasonIndex(self._read_reason_index)
+        self.reason_index_records = int(os.environ.get("REASON_INDEX_RECORDS", 20000))
 
-        self.set_table_in_use(os.getenv("CURRENT_DB_TABLE"))
+        self.set_table_in_use(table if table else os.getenv("CURRENT_DB_TABLE"))
         self.init_db()
         # self.excel_to_db("Budget Sheet.xlsx")
 
     def __del__(self):
-        if DBManager.__conn__:
-            DBManager.__conn__.close()
-            DBManager.__conn__ = None
+        with DBManager.__conns_lock__:
+            for conn in DBManager.__conns__.values():
+                # writes still waiting for a group commit are kept
+                conn.commit()
+                conn.close()
+            DBManager.__conns__.clear()
 
     @contextmanager
-    def get_db_conn(self):
-        try:
-            if DBManager.__conn__:
-                conn = DBManager.__conn__
-            else:
-                conn = sqlite3.connect(self.path)
-                DBManager.__conn__ = conn
+    def get_db_conn(self, write=True):
+        '''
+        a unit of work on the connection of the current thread, units opened inside another unit join it.
+        :param write: read only units are never committed. Write units are committed when the outermost unit ends,
+        except on threads with a flush scheduler, where the commit is delayed by up to commit_delay after the first
+        uncommitted write, so that writes close together share a single commit. Use flush to commit right away.
+        When profiling, the statements of the unit are handed to the profiler when the outermost unit ends
+        '''
+        conn = self._get_conn()
+        state = self._get_thread_state()
+        outermost = state["depth"] == 0
+        # a failed write unit only rolls back its own changes, not the earlier ones waiting for their commit
+        savepoint = write and outermost and conn.in_transaction
+        if savepoint:
+            conn.execute("SAVEPOINT unit_of_work")
 
+        state["depth"] += 1
+        try:
             yield conn
         except Exception as e:
-            conn.rollback()
+            state["depth"] -= 1
+            if not outermost:
+                raise
+            if savepoint:
+                conn.execute("ROLLBACK TO unit_of_work")
+                conn.execute("RELEASE unit_of_work")
+            elif write or not state["pending_since"]:
+                conn.rollback()
+                state["pending_since"] = None
+            if self.profiler.enabled:
+                self.profiler.end_unit()
             self.logger.error("Error in accessing db connection: {}".format(str(e)))
             raise RuntimeError("Error in accessing db connection: {}".format(str(e)))
-        finally:
+
+        state["depth"] -= 1
+        if savepoint:
+            conn.execute("RELEASE unit_of_work")
+        if write and not state["pending_since"]:
+            state["pending_since"] = time.monotonic()
+        if outermost and state["pending_since"]:
+            self._commit_or_schedule_flush(conn, state)
+        if outermost and self.profiler.enabled:
+            self.profiler.end_unit()
+
+    def _get_conn(self):
+        conn = DBManager.__conns__.get(threading.get_ident())
+        if not conn:
+            # connections are closed from whichever thread deletes the manager, but only ever used by their own
+            conn = sqlite3.connect(self.path, check_same_thread=False,
+                                   cached_statements=self.connection_settings["statement_cache_size"],
+                                   factory=ProfiledConnection if self.profiler.enabled else sqlite3.Connection)
+            if self.profiler.enabled:
+                conn.profiler = self.profiler
+            self._configure_connection(conn)
+            with DBManager.__conns_lock__:
+                DBManager.__conns__[threading.get_ident()] = conn
+        return conn
+
+    def _get_thread_state(self):
+        if not hasattr(self._thread_state, "depth"):
+            self._thread_state.depth = 0
+            self._thread_state.pending_since = None
+            self._thread_state.flush_scheduled = False
+        return self._thread_state.__dict__
+
+    def set_flush_scheduler(self, scheduler):
+        '''
+        :param scheduler: callable taking (delay in seconds, flush), that calls flush on the current thread after the
+        delay, e.g. with tk's after(). Writes on the current thread are group committed from then on
+        '''
+        self._flush_schedulers[threading.get_ident()] = scheduler
+
+    def _commit_or_schedule_flush(self, conn, state):
+        scheduler = self._flush_schedulers.get(threading.get_ident())
+        remaining = state["pending_since"] + self.commit_delay - time.monotonic()
+        if not scheduler or remaining <= 0:
+            self._commit(conn, state)
+        elif not state["flush_scheduled"]:
+            state["flush_scheduled"] = True
+            scheduler(remaining, self.flush)
+
+    def flush(self):
+        '''
+        commits the writes of the current thread that are waiting for a group commit
+        '''
+        state = self._get_thread_state()
+        state["flush_scheduled"] = False
+        if state["pending_since"] and state["depth"] == 0:
+            self._commit(self._get_conn(), state)
+
+    def _commit(self, conn, state):
+        state["pending_since"] = None
+        try:
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self.logger.error("Error in committing to db: {}".format(str(e)))
+            raise RuntimeError("Error in committing to db: {}".format(str(e)))
+        with DBManager.__conns_lock__:
+            self.commit_count += 1
+
+    def _read_connection_settings(self, profile=None):
+        profile = profile if profile else os.environ.get("DB_PROFILE", "balanced")
+        if profile not in DBManager.__profiles__:
+            self.logger.error("Unknown db profile {}, using balanced".format(profile))
+            profile = "balanced"
+
+        settings = dict(DBManager.__profiles__[profile])
+        for setting in settings:
+            value = os.environ.get("DB_" + setting.upper())
+            if not value:
+                continue
             try:
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                self.logger.error("Error in committing to db: {}".format(str(e)))
-                raise RuntimeError("Error in committing to db: {}".format(str(e)))
+                if setting in DBManager.__setting_values__:
+                    allowed = DBManager.__setting_values__[setting]
+                    if value.upper() not in allowed:
+                        raise ValueError("must be one of {}".format(", ".join(sorted(allowed))))
+                    settings[setting] = value.upper()
+                else:
+                    settings[setting] = int(value)
+            except ValueError as e:
+                self.logger.error("Invalid value {} for DB_{}, {}".format(value, setting.upper(), str(e)))
+        settings["profile"] = profile
+        return settings
+
+    def _configure_connection(self, conn):
+        settings = self.connection_settings
+        # values are validated when read, pragmas do not take parameters
+        for setting in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"):
+            conn.execute("PRAGMA {}={}".format(setting, settings[setting]))
+
+    def get_connection_settings(self):
+        '''
+        :return: dict of the settings in effect on the connection of the current thread
+        '''
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            active = {"profile": self.connection_settings["profile"],
+                      "statement_cache_size": self.connection_settings["statement_cache_size"]}
+            for setting in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store"):
+                c.execute("PRAGMA {}".format(setting))
+                active[setting] = c.fetchone()[0]
+            # synchronous and temp_store are reported as numbers
+            active["synchronous"] = ["OFF", "NORMAL", "FULL", "EXTRA"][active["synchronous"]]
+            active["temp_store"] = ["DEFAULT", "FILE", "MEMORY"][active["temp_store"]]
+            active["journal_mode"] = active["journal_mode"].upper()
+            return active
+
+    def add_write_listener(self, listener):
+        self.write_listeners.append(listener)
+
+    def _notify_write(self, table):
+        for listener in self.write_listeners:
+            listener(table)
 
     def set_table_in_use(self, table):
         DBManager.__table__ = table
         os.environ['CURRENT_DB_TABLE'] = table
-        set_key(os.path.join(os.path.dirname(__file__), '.env'), "CURRENT_DB_TABLE", table)
+        if self.env_path:
+            set_key(self.env_path, "CURRENT_DB_TABLE", table)
 
         with self.get_db_conn() as conn:
+            self._create_table(conn.cursor(), table)
+        self.reasons.invalidate()
+
+    def _create_table(self, c, table):
+        '''
+        creates the table, with its indexes, monthly summary and search index, if it does not exist yet. Also upgrades
+        tables created before the indexes and the monthly summary existed
+        '''
+        c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name=? ''', (table,))
+        if not c.fetchone():
+            c.execute('''CREATE TABLE {} (id integer primary key, date text, reason text, amount real)'''
+                      .format(table))
+        self._create_indexes(c, table)
+        self._create_monthly_summary(c, table)
+        self._create_search_index(c, table)
+
+    def _read_reason_index(self):
+        '''
+        :return: the (id, reason) of the latest records of the table in use, to build the reason index from. Reasons
+        last used before them are only suggested again once they are used again
+        '''
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
-            c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name=? ''', (table,))
-            if not c.fetchone():
-                c.execute('''CREATE TABLE {} (id integer primary key, date text, reason text, amount real)'''
-                          .format(table))
+            c.execute('''SELECT id, reason FROM {} ORDER BY id DESC LIMIT ?'''.format(self.__table__),
+                      (self.reason_index_records,))
+            return c.fetchall()
+
+    @staticmethod
+    def _create_indexes(c, table):
+        for suffix, columns in DBManager.__indexes__.items():
+            c.execute('''CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({2})'''.format(table, suffix, columns))
+
+    @staticmethod
+    def _create_monthly_summary(c, table):
+        '''
+        creates the per month summary of the table, kept up to date by triggers on every insert and delete
+        '''
+        c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name=? ''', (table + "_monthly",))
+        if c.fetchone():
+            # summaries created before the delete trigger only recomputed what it had to get the current one
+            DBManager._create_monthly_delete_trigger(c, table)
+            return
+
+        c.execute('''CREATE TABLE {}_monthly (month text primary key, total real, count integer, min real, max real)'''
+                  .format(table))
+        c.execute('''CREATE TRIGGER IF NOT EXISTS {0}_monthly_insert AFTER INSERT ON {0}
+                     BEGIN
+                         INSERT OR IGNORE INTO {0}_monthly
+                             VALUES (substr(new.date, 1, 7), 0, 0, new.amount, new.amount);
+                         UPDATE {0}_monthly SET total=total+new.amount, count=count+1, min=MIN(min, new.amount),
+                                max=MAX(max, new.amount)
+                             WHERE month=substr(new.date, 1, 7);
+                     END'''.format(table))
+        DBManager._create_monthly_delete_trigger(c, table)
+        DBManager._rebuild_monthly_summary(c, table)
+
+    @staticmethod
+    def _create_monthly_delete_trigger(c, table):
+        '''
+        creates the trigger keeping the monthly summary up to date on deletes, or replaces it if it is not the current
+        one. The min and max of the month are only read again from the table when the deleted record was the min or
+        the max, that read covers the whole month, so doing it for every deleted record made bulk deletes quadratic
+        '''
+        sql = '''CREATE TRIGGER {0}_monthly_delete AFTER DELETE ON {0}
+                 BEGIN
+                     UPDATE {0}_monthly SET total=total-old.amount, count=count-1,
+                            min=CASE WHEN old.amount<=min
+                                THEN (SELECT MIN(amount) FROM {0} WHERE date>=month||'-01' AND date<month||'-99')
+                                ELSE min END,
+                            max=CASE WHEN old.amount>=max
+                                THEN (SELECT MAX(amount) FROM {0} WHERE date>=month||'-01' AND date<month||'-99')
+                                ELSE max END
+                         WHERE month=substr(old.date, 1, 7);
+                     DELETE FROM {0}_monthly WHERE month=substr(old.date, 1, 7) AND count<=0;
+                 END'''.format(table)
+        c.execute('''SELECT sql FROM sqlite_master WHERE type='trigger' AND name=? ''', (table + "_monthly_delete",))
+        row = c.fetchone()
+        if row and row[0] == sql:
+            return
+        c.execute('''DROP TRIGGER IF EXISTS {}_monthly_delete'''.format(table))
+        c.execute(sql)
+
+    def _create_search_index(self, c, table):
+        '''
+        creates the full text index of the reasons of the table, kept up to date by triggers on every insert and
+        delete. The index does not keep a copy of the reasons, it reads them from the table
+        '''
+        c.execute('''SELECT name FROM sqlite_master WHERE type='table' AND name=? ''', (table + "_search",))
+        if c.fetchone():
+            return
+
+        try:
+            c.execute('''CREATE VIRTUAL TABLE {0}_search USING fts5(reason, content='{0}', content_rowid='id')'''
+                      .format(table))
+        except sqlite3.OperationalError as e:
+            # sqlite was built without fts5, everything but searching still works
+            self.logger.error("Cannot create the search index of {}: {}".format(table, str(e)))
+            return
+        DBManager._create_search_insert_trigger(c, table)
+        c.execute('''CREATE TRIGGER IF NOT EXISTS {0}_search_delete AFTER DELETE ON {0}
+                     BEGIN
+                         INSERT INTO {0}_search ({0}_search, rowid, reason) VALUES ('delete', old.id, old.reason);
+                     END'''.format(table))
+        c.execute('''CREATE TRIGGER IF NOT EXISTS {0}_search_update AFTER UPDATE OF reason ON {0}
+                     BEGIN
+                         INSERT INTO {0}_search ({0}_search, rowid, reason) VALUES ('delete', old.id, old.reason);
+                         INSERT INTO {0}_search (rowid, reason) VALUES (new.id, new.reason);
+                     END'''.format(table))
+        c.execute('''INSERT INTO {0}_search ({0}_search) VALUES ('rebuild')'''.format(table))
+
+    @staticmethod
+    def _create_search_insert_trigger(c, table):
+        c.execute('''CREATE TRIGGER IF NOT EXISTS {0}_search_insert AFTER INSERT ON {0}
+                     BEGIN
+                         INSERT INTO {0}_search (rowid, reason) VALUES (new.id, new.reason);
+                     END'''.format(table))
+
+    @contextmanager
+    def _bulk_search_index(self, c, table, num_records, min_records=1000):
+        '''
+        indexing the reasons one record at a time from the insert trigger makes bulk inserts several times slower,
+        so for at least min_records, records inserted into the table inside the block are indexed together at the
+        end. Only for records inserted with ids larger than any already in the table
+        :param c: cursor of the unit of work the records are inserted in
+        :param table: table the records are inserted into
+        :param num_records: number of records about to be inserted
+        '''
+        c.execute('''SELECT name FROM sqlite_master WHERE type='trigger' AND name=? ''',
+                  (table + "_search_insert",))
+        if num_records < min_records or not c.fetchone():
+            yield
+            return
+
+        # the trigger is back if the unit of work fails, as long as the drop is part of its transaction. sqlite3 only
+        # opens one by itself before inserts, updates and deletes
+        if not c.connection.in_transaction:
+            c.execute("BEGIN")
+        c.execute('''DROP TRIGGER {}_search_insert'''.format(table))
+        c.execute('''SELECT COALESCE(MAX(id), 0) FROM {}'''.format(table))
+        last_id = c.fetchone()[0]
+        yield
+        c.execute('''INSERT INTO {0}_search (rowid, reason) SELECT id, reason FROM {0} WHERE id>?'''
+                  .format(table), (last_id,))
+        self._create_search_insert_trigger(c, table)
+
+    @staticmethod
+    def _rebuild_monthly_summary(c, table):
+        c.execute('''DELETE FROM {}_monthly'''.format(table))
+        c.execute('''INSERT INTO {0}_monthly
+                     SELECT substr(date, 1, 7), SUM(amount), COUNT(*), MIN(amount), MAX(amount) FROM {0}
+                     GROUP BY substr(date, 1, 7)'''.format(table))
+
+    def rebuild_monthly_summary(self):
+        with self.get_db_conn() as conn:
+            self._rebuild_monthly_summary(conn.cursor(), self.__table__)
+
+    def get_query_plans(self):
+        '''
+        :return: dict of query name -> (whether the query uses an index, sqlite query plan details)
+        '''
+        queries = {
+            "get_withdraw": ('''SELECT * FROM {} WHERE date=? ORDER BY id DESC''', ("",)),
+            "get_withdraws_before_date": ('''SELECT * FROM {} WHERE date<=? ORDER BY date DESC, id DESC LIMIT ?''',
+                                          ("", 1)),
+            "get_withdraws_in_month": ('''SELECT * FROM {} WHERE date>=? AND date<? ORDER BY id DESC''', ("", "")),
+            "delete_widthraw": ('''DELETE FROM {} WHERE date=? AND reason=? AND amount=?''', ("", "", 0)),
+            "delete_records": ('''DELETE FROM {} WHERE id=?''', (0,)),
+        }
+        plans = {}
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            for name, (query, params) in queries.items():
+                c.execute("EXPLAIN QUERY PLAN " + query.format(self.__table__), params)
+                details = [row[-1] for row in c.fetchall()]
+                plans[name] = (any(using in d for d in details for using in
+                                   ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY")),
+                               "; ".join(details))
+        return plans
 
     def init_db(self):
         if not os.path.exists(self.path):
@@ -72,66 +440,154 @@ class DBManager(object):
                 c = conn.cursor()
                 c.execute('''CREATE TABLE {} (id integer primary key, date text, reason text, amount real)'''
                           .format(self.__table__))
+                self._create_indexes(c, self.__table__)
+                self._create_monthly_summary(c, self.__table__)
 
-    def insert_new_withdraw(self, date, reason, amount):
+    def insert_new_withdraw(self, date, reason, amount, id=None):
+        '''
+        :param id: if none, the next free id, else the id of a record that was deleted and is inserted again
+        :return: id of the inserted record
+        '''
         with self.get_db_conn() as conn:
             c = conn.cursor()
-            c.execute('''INSERT INTO {} (date, reason, amount) VALUES (?, ?, ?)'''.format(self.__table__),
-                      (date, reason, amount))
+            c.execute('''INSERT INTO {} (id, date, reason, amount) VALUES (?, ?, ?, ?)'''.format(self.__table__),
+                      (id, date, reason, amount))
+            id = c.lastrowid
+        self.reasons.add(reason, id)
+        self._notify_write(self.__table__)
+        return id
+
+    def insert_many(self, records, ids=None):
+        '''
+        :param records: iterable of (date, reason, amount), validated with the same rules as a record entered in the app
+        :param ids: if none, the next free ids, else the ids of records that were deleted and are inserted again
+        :return: ids of the inserted records, in order. Nothing is inserted if any record is invalid
+        '''
+        records = self.convert_records(records)
+        if not records:
+            return []
+
+        with self.get_db_conn() as conn:
+            c = conn.cursor()
+            if ids:
+                c.executemany('''INSERT INTO {} (id, date, reason, amount) VALUES (?, ?, ?, ?)'''
+                              .format(self.__table__), [(id,) + record for id, record in zip(ids, records)])
+                last_id = None
+            else:
+                with self._bulk_search_index(c, self.__table__, len(records)):
+                    c.executemany('''INSERT INTO {} (date, reason, amount) VALUES (?, ?, ?)'''.format(self.__table__),
+                                  records)
+                # ids of a table without autoincrement are handed out one after another from the largest one
+                c.execute('''SELECT MAX(id) FROM {}'''.format(self.__table__))
+                last_id = c.fetchone()[0]
+        ids = list(ids) if ids else list(range(last_id - len(records) + 1, last_id + 1))
+        for id, record in zip(ids, records):
+            self.reasons.add(record[1], id)
+        self._notify_write(self.__table__)
+        return ids
+
+    def delete_records(self, ids, chunk_size=500):
+        '''
+        :param ids: ids of the records to delete
+        :param chunk_size: number of ids looked up at a time for the reasons of the records
+        '''
+        ids = list(ids)
+        with self.get_db_conn() as conn:
+            c = conn.cursor()
+            deleted = []
+            # the reasons are only needed to take them out of the reason index, if it was loaded
+            for start in range(0, len(ids) if self.reasons.built else 0, chunk_size):
+                chunk = ids[start:start + chunk_size]
+                c.execute('''SELECT id, reason FROM {} WHERE id IN ({})'''
+                          .format(self.__table__, ", ".join("?" * len(chunk))), chunk)
+                deleted += c.fetchall()
+            c.executemany('''DELETE FROM {} WHERE id=?'''.format(self.__table__), [(id,) for id in ids])
+        for id, reason in deleted:
+            self.reasons.remove(reason, id)
+        self._notify_write(self.__table__)
 
     def delete_widthraw(self, date, reason, amount):
         with self.get_db_conn() as conn:
             c = conn.cursor()
+            ids = []
+            if self.reasons.built:
+                c.execute('''SELECT id FROM {} WHERE date=? AND reason=? AND amount=?'''.format(self.__table__),
+                          (date, reason, amount))
+                ids = [row[0] for row in c.fetchall()]
             c.execute('''DELETE FROM {} WHERE date=? AND reason=? AND amount=?'''.format(self.__table__),
                       (date, reason, amount))
+        for id in ids:
+            self.reasons.remove(reason, id)
+        self._notify_write(self.__table__)
 
-    def get_num_records(self):
-        with self.get_db_conn() as conn:
+    def get_num_records(self, table=None):
+        '''
+        :param table: if none, the table in use
+        '''
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
-            c.execute('''SELECT COUNT(*) FROM {}'''.format(self.__table__))
+            c.execute('''SELECT COUNT(*) FROM {}'''.format(table if table else self.__table__))
             return c.fetchone()[0]
 
     def get_record_with_id(self, id):
-        if id > self.get_num_records():
-            raise ValueError("id is larger than number of records stored, invalid")
-
-        if id < 1:
-            raise ValueError("id is smaller than 1, invalid")
-
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
-            c.execute('''SELECT * FROM {} ORDER BY id LIMIT 1 OFFSET ?'''.format(self.__table__), id-1)
-            return c.fetchone()
+            c.execute('''SELECT * FROM {} WHERE id=?'''.format(self.__table__), (id,))
+            row = c.fetchone()
+
+        if not row:
+            raise ValueError("no record with id {}, invalid".format(id))
+        return row
 
     def get_records_after_id(self, id, offset):
         '''
         :param id:
         :param offset: number of records after the id, in reverse order.
-        :return: For example, id=5, offset=3, return records 5,4,3
+        :return: For example, id=5, offset=3, return records 5,4,3. Ids missing because of deletes are skipped over.
         '''
-        if id > self.get_num_records():
-            raise ValueError("id is larger than number of records stored, invalid")
-
-        if id - offset < 1:
-            raise ValueError("id is too small, invalid")
-
         if offset < 0:
             raise ValueError("offset must be positive, invalid")
 
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT * FROM {} WHERE id<=? ORDER BY id DESC LIMIT ?'''.format(self.__table__),
+                      (id, offset))
+            rows = c.fetchall()
+
+        if not rows:
+            raise ValueError("no records at or before id {}, invalid".format(id))
+        return rows
+
+    def get_records_older_than_id(self, id, num):
+        '''
+        :param id:
+        :param num: maximum number of records to return
+        :return: the num records right before the id, in reverse order. For example, id=5, num=3, return records 4,3,2
+        '''
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
-            c.execute('''SELECT * FROM {} ORDER BY id DESC LIMIT ? OFFSET ?'''.format(self.__table__),
-                      (offset, self.get_num_records() - id))
+            c.execute('''SELECT * FROM {} WHERE id<? ORDER BY id DESC LIMIT ?'''.format(self.__table__), (id, num))
+            return c.fetchall()
+
+    def get_records_newer_than_id(self, id, num):
+        '''
+        :param id:
+        :param num: maximum number of records to return
+        :return: the num records right after the id, in order. For example, id=5, num=3, return records 6,7,8
+        '''
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT * FROM {} WHERE id>? ORDER BY id LIMIT ?'''.format(self.__table__), (id, num))
             return c.fetchall()
 
     def get_first_date(self):
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
             c.execute('''SELECT * FROM {} ORDER BY id LIMIT 1'''.format(self.__table__))
             return c.fetchone()[1]
 
     def get_last_date(self):
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
             c.execute('''SELECT * FROM {} ORDER BY id DESC LIMIT 1'''.format(self.__table__))
             return c.fetchone()[1]
@@ -141,7 +597,7 @@ class DBManager(object):
         :param date: datetime object for the date of the withdraw, if none, defaults to last date in the table
         :return: rows of withdraws records in the given date, if none, return None
         '''
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
             if date:
                 if type(date) is datetime:
@@ -155,12 +611,76 @@ class DBManager(object):
             else:
                 return self.get_withdraw(self.get_last_date())
 
+    def get_withdraws_before_date(self, date=None, num=1):
+        '''
+        :param date: datetime object or date str, if none, defaults to the date of the last inserted record
+        :param num: maximum number of records to return
+        :return: the num most recent records dated on or before the given date, newest first, if none, return None.
+        The date of the first row is the closest date on or before the given date that has data.
+        '''
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            if date:
+                if type(date) is datetime:
+                    date_s = date.strftime(__date_format__)
+                # in other case, date is a str
+                else:
+                    date_s = date
+                c.execute('''SELECT * FROM {0} WHERE date<=? ORDER BY date DESC, id DESC LIMIT ?'''
+                          .format(self.__table__), (date_s, num))
+            else:
+                c.execute('''SELECT * FROM {0} WHERE date<=(SELECT date FROM {0} ORDER BY id DESC LIMIT 1)
+                             ORDER BY date DESC, id DESC LIMIT ?'''.format(self.__table__), (num,))
+            rows = c.fetchall()
+            return rows if len(rows) != 0 else None
+
+    def get_withdraws_in_range(self, start, end):
+        '''
+        :param start: date str of the first day of the range
+        :param end: date str of the last day of the range
+        :return: rows of withdraws records dated in the range, in order of date
+        '''
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT * FROM {} WHERE date>=? AND date<=? ORDER BY date, id'''.format(self.__table__),
+                      (start, end))
+            return c.fetchall()
+
+    def search_records(self, text, offset=0, num=None):
+        '''
+        :param text: words to search for, a reason matches if it has a word starting with each of them
+        :param offset: number of matching records skipped, newest first
+        :param num: maximum number of records to return, if none, return all of them
+        :return: (rows of the matching records newest first, number of matching records, total of their amounts)
+        '''
+        query = self._to_search_query(text)
+        if not query:
+            return [], 0, 0
+
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            try:
+                c.execute('''SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM {0}_search JOIN {0} ON id={0}_search.rowid
+                             WHERE {0}_search MATCH ?'''.format(self.__table__), (query,))
+            except sqlite3.OperationalError:
+                raise ValueError("{} has no search index, sqlite needs fts5 to search".format(self.__table__))
+            count, total = c.fetchone()
+            c.execute('''SELECT {0}.* FROM {0}_search JOIN {0} ON id={0}_search.rowid WHERE {0}_search MATCH ?
+                         ORDER BY date DESC, id DESC LIMIT ? OFFSET ?'''.format(self.__table__),
+                      (query, -1 if num is None else num, offset))
+            return c.fetchall(), count, total
+
+    @staticmethod
+    def _to_search_query(text):
+        # every word is quoted so characters of the fts5 query syntax in the text are searched for as is
+        return " ".join('"{}"*'.format(word) for word in re.findall(r"\w+", str(text)))
+
     def get_withdraws_in_month(self, date=None):
         '''
         :param date: datetime object for the month to count total spending
         :return:
         '''
-        with self.get_db_conn() as conn:
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
             if date:
                 if type(date) is datetime:
@@ -168,106 +688,390 @@ class DBManager(object):
                     # in other case, date is a str
                 else:
                     date_s = date
-                # example: 2018-08-09 -> 2018-08%
-                date_s = date_s.split("-")[:-1]
-                date_s[-1] += "%"
-                date_s = "-".join(date_s)
+                # example: 2018-08-09 -> [2018-08-01, 2018-09-01), a range the date index can be used for
+                start, end = self._month_range(date_s)
 
-                c.execute('''SELECT * FROM {} WHERE date LIKE ? ORDER BY id DESC'''.format(self.__table__), (date_s,))
+                c.execute('''SELECT * FROM {} WHERE date>=? AND date<? ORDER BY id DESC'''.format(self.__table__),
+                          (start, end))
                 rows = c.fetchall()
                 return rows if len(rows) != 0 else None
             else:
                 return self.get_withdraws_in_month(self.get_last_date())
 
     def get_monthly_total(self, date=None):
-        total = 0
-        rows = self.get_withdraws_in_month(date)
-        if rows:
-            for row in rows:
-                total += float(row[3])
-        return total
-
-    def excel_to_db(self, file_path):
-        table_name = os.path.splitext(os.path.split(file_path)[1])[0]
-        self.set_table_in_use(table_name)
+        '''
+        :param date: datetime object or date str in the month, if none, defaults to last date in the table
+        :return: total spending of the month, read from the monthly summary
+        '''
+        if not date:
+            date = self.get_last_date()
+        if type(date) is datetime:
+            date = date.strftime(__date_format__)
+
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT total FROM {}_monthly WHERE month=?'''.format(self.__table__), (date[:7],))
+            row = c.fetchone()
+            return row[0] if row else 0
+
+    def get_monthly_totals(self, year):
+        '''
+        :param year: int or str year, e.g. 2018
+        :return: rows of (month, total, count, min, max) for every month of the year that has records, in order
+        '''
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT * FROM {}_monthly WHERE month>=? AND month<=? ORDER BY month'''.format(self.__table__),
+                      ("{}-01".format(year), "{}-12".format(year)))
+            return c.fetchall()
+
+    def excel_to_db(self, file_path, progress=None, batch_size=5000):
+        '''
+        :param file_path: workbook with a Date / Amount / _ / Reason block of columns per month, the header of the date
+        column is the month, e.g. "2018 Aug". The name of the file is used as the name of the table
+        :param progress: optional callable, called with (records inserted, total records) after every batch
+        :param batch_size: number of records inserted per executemany
+        :return: number of records inserted. If the import fails or is cancelled, nothing is changed. The table in use
+        is not changed, the caller puts the table in use once the import is done if it wants to
+        '''
+        table_name, records = self.read_excel(file_path)
+        with self._importing_into(table_name):
+            inserted = self._insert_excel_records(table_name, records, progress, batch_size)
+        self._imported(file_path, table_name, inserted)
+        return inserted
+
+    @contextmanager
+    def _importing_into(self, table):
+        '''
+        write unit of work of an import into the table, which is created in the unit's transaction, so if the block
+        fails, the table only exists if it already did. The table in use is left as is, imports run in the background
+        while the app keeps reading and writing it
+        '''
+        with self.get_db_conn() as conn:
+            # sqlite3 only opens a transaction by itself before inserts, updates and deletes, not CREATE TABLE
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            self._create_table(conn.cursor(), table)
+            yield
+
+    def _imported(self, file_path, table, inserted):
+        # only once the records are committed, listeners may read them from another connection
+        if table == self.__table__:
+            self.reasons.invalidate()
+        self._notify_write(table)
+        self.logger.info("Imported {} records from {} into {}".format(inserted, file_path, table))
+
+    def excels_to_db(self, file_paths, workers=None, progress=None, batch_size=5000):
+        '''
+        imports many workbooks, each into the table named after it like excel_to_db. Parsing a workbook is slow and
+        takes a whole core, so they are parsed in parallel by a pool of processes, while this thread inserts the
+        records of each workbook as soon as it and the ones before it are parsed. Only this thread writes, sqlite
+        allows one writer at a time. Every workbook is imported in its own transaction, a workbook that fails to
+        import is skipped and the others are still imported. If cancelled by progress raising, the workbook being
+        inserted is rolled back, the ones before it are kept
+        :param file_paths: paths of the workbooks, imported in this order
+        :param workers: number of processes parsing workbooks, if none, read from IMPORT_WORKERS, defaults to the
+        number of cores. With 1, the workbooks are parsed in this thread
+        :param progress: optional callable, called with (workbooks done, total workbooks, records inserted, total
+        records) after every batch of records inserted, the records are of the workbook being inserted. And with
+        (workbooks done, total workbooks) once after every workbook
+        :param batch_size: number of records inserted per executemany
+        :return: list of (file path, table, records inserted, error message or none), one for every workbook. The table
+        in use is not changed
+        '''
+        if workers is None:
+            workers = int(os.environ.get("IMPORT_WORKERS", 0)) or os.cpu_count() or 1
+        workers = max(1, min(workers, len(file_paths)))
 
-        wb = load_workbook(filename=file_path, data_only=True)
-        ws = wb.active
+        if workers == 1:
+            parsed = (self._read_excel_or_error(file_path) for file_path in file_paths)
+            return self._insert_excels(file_paths, parsed, progress, batch_size)
 
+        # only imported when needed, the app only starts processes for batch imports
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # forking would copy the open connections and the threads' locks into the workers, spawned ones start clean
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(DBManager.read_excel, file_path) for file_path in file_paths]
+            try:
+                return self._insert_excels(file_paths, (self._get_result_or_error(future) for future in futures),
+                                           progress, batch_size)
+            finally:
+                # when cancelled or failed, the workbooks not being parsed yet are not parsed at all
+                for future in futures:
+                    future.cancel()
+
+    def _read_excel_or_error(self, file_path):
+        try:
+            return self.read_excel(file_path)
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def _get_result_or_error(future):
+        try:
+            return future.result()
+        except Exception as e:
+            return e
+
+    def _insert_excels(self, file_paths, parsed, progress, batch_size):
+        '''
+        :param parsed: iterable of the (table, records) read from each workbook, or the exception reading it raised
+        '''
+        results = []
+        for file_path, result in zip(file_paths, parsed):
+            if isinstance(result, Exception):
+                self.logger.error("Error in reading {}: {}".format(file_path, str(result)))
+                results.append((file_path, None, 0, str(result)))
+            else:
+                table_name, records = result
+                insert_progress = (lambda inserted, total: progress(len(results), len(file_paths), inserted, total)) \
+                    if progress else None
+                try:
+                    with self._importing_into(table_name):
+                        inserted = self._insert_excel_records(table_name, records, insert_progress, batch_size)
+                    self._imported(file_path, table_name, inserted)
+                    results.append((file_path, table_name, inserted, None))
+                except (RuntimeError, sqlite3.Error) as e:
+                    # the records of the workbook were rolled back
+                    results.append((file_path, table_name, 0, str(e)))
+            if progress:
+                progress(len(results), len(file_paths))
+        return results
+
+    def _insert_excel_records(self, table, records, progress, batch_size):
+        inserted = 0
         with self.get_db_conn() as conn:
             c = conn.cursor()
-            for idx_col, col in enumerate(ws.columns):
-                if self._is_date(col[0].value):
-                    for idx_row, cell in enumerate(col[1:]):
-                        # if the cell has value, it is a date
-                        if cell.value:
-                            year = str(col[0].value.split()[0])
-                            month = str(self._month_to_number(col[0].value.split()[1]))
-                            day = str(cell.value)
+            with self._bulk_search_index(c, table, len(records)):
+                for start in range(0, len(records), batch_size):
+                    batch = records[start:start + batch_size]
+                    c.executemany('''INSERT INTO {} (date, reason, amount) VALUES (?, ?, ?)'''.format(table), batch)
+                    inserted += len(batch)
+                    if progress:
+                        progress(inserted, len(records))
+        return inserted
+
+    @staticmethod
+    def read_excel(file_path):
+        '''
+        reads a workbook for excel_to_db, without touching the db, so it can run in another process
+        :return: (name of the table, list of the (date, reason, amount) records of the workbook, month block by month
+        block, in the order the blocks appear)
+        '''
+        # read only mode streams the rows instead of loading the whole workbook
+        from openpyxl import load_workbook  # only imported when needed, it is slow to import
+
+        wb = load_workbook(filename=file_path, read_only=True, data_only=True)
+        try:
+            blocks = DBManager._read_excel_blocks(wb.active)
+        finally:
+            wb.close()
+        return os.path.splitext(os.path.split(file_path)[1])[0], [record for records in blocks for record in records]
+
+    @staticmethod
+    def _read_excel_blocks(ws):
+        '''
+        :param ws: worksheet
+        :return: list of (date, reason, amount) lists, one for each month block of columns, in column order
+        '''
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, ())
+        blocks = []  # (column of the days, year, month, records)
+        for idx_col, value in enumerate(header):
+            if DBManager._is_date(value):
+                blocks.append((idx_col, str(value.split()[0]), str(DBManager._month_to_number(value.split()[1])), []))
+
+        for row in rows:
+            for idx_col, year, month, records in blocks:
+                # if the cell has value, it is a date
+                day = row[idx_col] if idx_col < len(row) else None
+                if day:
+                    amount = row[idx_col + 1] if idx_col + 1 < len(row) else None
+                    if amount:
+                        reason = row[idx_col + 3] if idx_col + 3 < len(row) else None
+                        if reason:
+                            day = str(day)
                             day = day if len(day) == 2 else "0" + day
-                            date = "-".join([year, month, day])
-                            amount = ws.cell(row=idx_row+2, column=idx_col+2).value
-                            if amount:
-                                reason = ws.cell(row=idx_row+2, column=idx_col+4).value
-                                if reason:
-                                    c.execute('''INSERT INTO {} (date, reason, amount) VALUES (?, ?, ?)'''
-                                              .format(self.__table__), (date, reason, amount))
-
-    def db_to_excel(self):
-        wb = Workbook()
-        ws = wb.active
+                            records.append(("-".join([year, month, day]), reason, amount))
+        return [records for _, _, _, records in blocks]
 
-        with self.get_db_conn() as conn:
+    def db_to_excel(self, save_path=None, table=None, progress=None):
+        '''
+        :param save_path: if none, defaults to budgets/<table>.xlsx
+        :param table: table exported, if none, the table in use
+        :param progress: optional callable, called with (records read, total records) every few thousand records
+        :return: path of the exported workbook
+
+        Each month is a block of 7 columns, Date / Amount / _ / Reason / _ / Sum / _, the first block starting at column
+        B. Rows are streamed from the db, grouped into month blocks as they go past, and written with openpyxl's write
+        only mode to a temporary file that replaces the previous export once it is complete.
+
+        The months are side by side, so every row of the sheet has a record of every month, and a write only sheet
+        is written row by row. So every record is held in memory, as a (day, amount, reason) tuple, before the first
+        row is written, memory grows with the size of the table.
+        '''
+        # read once, the table in use may change while a background export runs
+        table = table if table else self.__table__
+        if not save_path:
+            save_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "budgets", "{}.xlsx".format(table))
+
+        total = self.get_num_records(table) if progress else 0
+        with self.get_db_conn(write=False) as conn:
             c = conn.cursor()
-            c.execute('''SELECT * FROM {}'''.format(self.__table__))
-            curr_year_month, curr_day, curr_row, curr_last_col = "", 0, 1, 1
-            total = 0
-
-            for row in c.fetchall():
-                _date = row[1].split("-")
-                year_month = " ".join([_date[0], _date[1]])
-                day = int(_date[-1])
-
-                if year_month != curr_year_month:
-                    if curr_last_col != 1:  # ignore for the first iteration of the loop
-                        num_days_in_month = monthrange(*list(map(int, curr_year_month.split(" "))))[1]
-                        if day != num_days_in_month:
-                            while curr_day <= num_days_in_month-1:
-                                curr_row += 1
-                                curr_day += 1
-                                ws.cell(row=curr_row, column=curr_last_col - 6).value = curr_day
-
-                        ws.cell(row=2, column=curr_last_col-1).value = total
-                        total = 0
-
-                    curr_last_col += 7
-                    curr_year_month = year_month
-                    curr_row = 1
-                    curr_day = 0
-
-                    ws.cell(row=1, column=curr_last_col-1).value = "Sum"
-                    ws.cell(row=1, column=curr_last_col-3).value = "Reason"
-                    ws.cell(row=1, column=curr_last_col-5).value = "Amount"
-                    ws.cell(row=1, column=curr_last_col-6).value = " ".join([_date[0], self._number_to_month(_date[1])])
-
-                while curr_day < day:
-                    curr_day += 1
-                    if curr_day != day:
-                        curr_row += 1
-                        ws.cell(row=curr_row, column=curr_last_col - 6).value = curr_day
-
-                curr_row += 1
-
-                ws.cell(row=curr_row, column=curr_last_col - 3).value = row[2]
-                ws.cell(row=curr_row, column=curr_last_col - 5).value = row[3]
-                ws.cell(row=curr_row, column=curr_last_col - 6).value = int(row[1].split("-")[-1])
-                total += row[3]
-
-        save_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "budgets",
-                                 "{}.xlsx".format(self.__table__))
-        if os.path.exists(save_path):
-            os.remove(save_path)
-        wb.save(save_path)
+            c.execute('''SELECT date, reason, amount FROM {} ORDER BY id'''.format(table))
+            blocks = self._month_blocks(c, (lambda read: progress(read, total)) if progress else None)
+
+        from openpyxl import Workbook  # only imported when needed, it is slow to import
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        for idx_row in range(max([len(records) + 1 for _, _, records in blocks] + [0])):
+            row = [None]
+            for header, month_total, records in blocks:
+                if idx_row == 0:
+                    row += [header, "Amount", None, "Reason", None, "Sum", None]
+                elif idx_row <= len(records):
+                    day, amount, reason = records[idx_row - 1]
+                    row += [day, amount, None, reason, None, month_total if idx_row == 1 else None, None]
+                else:
+                    row += [None] * 7
+            ws.append(row)
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=os.path.dirname(save_path))
+        os.close(fd)
+        try:
+            wb.save(tmp_path)
+            replace_file(tmp_path, save_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return save_path
+
+    def _month_blocks(self, rows, progress=None, progress_interval=5000):
+        '''
+        :param rows: iterable of (date, reason, amount), consecutive records of the same month form one block
+        :param progress: optional callable, called with the number of rows read every progress_interval rows
+        :return: list of blocks, each (header of the month, sum of the month, list of (day, amount, reason) rows)
+        '''
+        blocks = []
+        block, curr_year_month, curr_day, total = None, "", 0, 0
+
+        def finish_block():
+            # days after the last record of the month still get a row
+            num_days_in_month = monthrange(*map(int, curr_year_month.split("-")))[1]
+            day = curr_day
+            while day < num_days_in_month:
+                day += 1
+                block.append((day, None, None))
+            blocks[-1] = (blocks[-1][0], total, block)
+
+        for idx, (date, reason, amount) in enumerate(rows):
+            if progress and idx % progress_interval == 0:
+                progress(idx)
+            year, month, day = date.split("-")
+            day = int(day)
+            if date[:7] != curr_year_month:
+                if block is not None:
+                    finish_block()
+                curr_year_month, curr_day, total = date[:7], 0, 0
+                block = []
+                blocks.append((" ".join([year, self._number_to_month(month)]), 0, block))
+
+            # days without records still get a row with only the day in it
+            while curr_day < day - 1:
+                curr_day += 1
+                block.append((curr_day, None, None))
+            curr_day = max(curr_day, day)
+
+            block.append((day, amount, reason))
+            total += amount
+
+        if block is not None:
+            finish_block()
+        return blocks
+
+    def db_to_snapshot(self, save_path, table=None):
+        '''
+        :param save_path: .bp file the table is written to, in a single pass over the table
+        :param table: table written, if none, the table in use
+        :return: number of records written
+        '''
+        table = table if table else self.__table__
+        with self.get_db_conn(write=False) as conn:
+            c = conn.cursor()
+            c.execute('''SELECT id, date, reason, amount FROM {} ORDER BY id'''.format(table))
+            return write_snapshot(save_path, table, c)
+
+    def bp_to_db(self, file_path):
+        '''
+        :param file_path: .bp file, the name of the file is used as the name of the table. If the table already has
+        records in the db, it is used as is, else the records of the snapshot are loaded into it. Older .bp files only
+        point to the table in the db
+        :return: number of records loaded from the snapshot. If loading fails, nothing is changed. The table in use is
+        not changed, like excel_to_db
+        '''
+        table_name = os.path.splitext(os.path.split(file_path)[1])[0]
+        with self._importing_into(table_name):
+            if not is_snapshot(file_path) or self.get_num_records(table_name) > 0:
+                return 0
+
+            _, records = read_snapshot(file_path)
+            with self.get_db_conn() as conn:
+                c = conn.cursor()
+                # the table is empty, so every id of the snapshot is larger than any in the table
+                with self._bulk_search_index(c, table_name, len(records)):
+                    c.executemany('''INSERT INTO {} (id, date, reason, amount) VALUES (?, ?, ?, ?)'''
+                                  .format(table_name), records)
+        self._imported(file_path, table_name, len(records))
+        return len(records)
+
+    @staticmethod
+    def convert_records(records):
+        '''
+        :param records: iterable of (date, reason, amount)
+        :return: list of the records converted into the format stored in the db
+        '''
+        converted = []
+        for idx, (date, reason, amount) in enumerate(records):
+            try:
+                converted.append((DBManager._convert_date(date), DBManager._convert_reason(reason),
+                                  DBManager._convert_amount(amount)))
+            except ValueError as e:
+                raise ValueError("record {}: {}".format(idx + 1, str(e)))
+        return converted
+
+    @staticmethod
+    def _convert_date(date):
+        '''
+        :param date:
+        :return: convert the given date string into the desired format
+        '''
+        return convert_date(date)
+
+    @staticmethod
+    def _convert_amount(amount):
+        try:
+            return float(amount)
+        except ValueError:
+            raise ValueError("{} is not a valid number".format(amount))
+
+    @staticmethod
+    def _convert_reason(reason):
+        if reason != "":
+            return reason
+        raise ValueError("reason cannot be empty")
+
+    @staticmethod
+    def _month_range(date):
+        '''
+        :param date: date str, e.g. 2018-08-09
+        :return: first day of the month and first day of the following month, e.g. (2018-08-01, 2018-09-01)
+        '''
+        year, month = map(int, date.split("-")[:2])
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return "{:04d}-{:02d}-01".format(year, month), "{:04d}-{:02d}-01".format(next_year, next_month)
 
     @staticmethod
     def _is_date(date):
@@ -0,0 +1,138 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(object):
+    '''
+    a call submitted to the DBWorker. The callbacks are always called from the tk thread
+    '''
+    def __init__(self, worker, channel=None, generation=0, callback=None, error_callback=None, progress_callback=None,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker = worker
+        self.channel = channel
+        self.generation = generation
+        self.callback = callback
+        self.error_callback = error_callback
+        self.progress_callback = progress_callback
+        self.future = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        # a job that has not started yet still runs, only to see it was cancelled, so its error callback is called
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report_progress(self, *progress):
+        '''
+        passed as the progress callable of long jobs, called from the worker thread, usually with (done, total).
+        Raising here is how a cancelled job stops, the transaction it is in is rolled back
+        '''
+        if self.is_cancelled():
+            raise JobCancelled("job was cancelled")
+        self.worker.results.put(("progress", self, progress))
+
+    def is_stale(self):
+        return self.channel is not None and self.generation != self.worker.generations.get(self.channel)
+
+
+class DBWorker(object):
+    '''
+    runs db calls on a thread pool so they never block the tk mainloop. Results are put on a queue that the tk thread
+    polls with after(), and handed to the callbacks of the job there.
+
+    Jobs submitted on the same channel supersede each other, e.g. the navigation channel, only the result of the latest
+    job of a channel is handed to its callback. A callback that raises is logged, the other results are still handed
+    out
+    '''
+    def __init__(self, window, logger, max_workers=2, poll_interval=20, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window = window
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="DBWorker")
+        self.results = queue.Queue()
+        self.generations = {}
+        self.jobs = set()
+        self._shut_down = False
+
+        self._poll_job = self.window.after(self.poll_interval, self._poll)
+
+    def submit(self, fn, *args, channel=None, callback=None, error_callback=None, progress_callback=None, **kwargs):
+        '''
+        :param fn: called in a worker thread with args and kwargs, plus progress=job.report_progress if a
+        progress_callback is given
+        :param channel: jobs on the same channel supersede each other
+        :param callback: called with the return value of fn
+        :param error_callback: called with the exception raised by fn, none if the job was cancelled
+        :param progress_callback: called with what fn reports, e.g. (done, total), whenever fn reports progress
+        :return: the job
+        '''
+        generation = 0
+        if channel is not None:
+            generation = self.generations.get(channel, 0) + 1
+            self.generations[channel] = generation
+
+        job = Job(self, channel, generation, callback, error_callback, progress_callback)
+        if progress_callback:
+            kwargs["progress"] = job.report_progress
+
+        def run():
+            if job.is_cancelled() or job.is_stale():
+                self.results.put(("skipped", job, None))
+                return
+            try:
+                self.results.put(("done", job, fn(*args, **kwargs)))
+            except Exception as e:
+                self.results.put(("error", job, e))
+
+        self.jobs.add(job)
+        job.future = self.executor.submit(run)
+        return job
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    kind, job, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if kind == "progress":
+                    if not job.is_cancelled() and job.progress_callback:
+                        self._call(job.progress_callback, *value)
+                    continue
+
+                self.jobs.discard(job)
+                # results of jobs that were cancelled or superseded while running are dropped
+                if job.is_cancelled() or job.is_stale():
+                    if job.is_cancelled() and job.error_callback:
+                        self._call(job.error_callback, None)
+                    continue
+                if kind == "done" and job.callback:
+                    self._call(job.callback, value)
+                elif kind == "error" and job.error_callback:
+                    self._call(job.error_callback, value)
+        finally:
+            if not self._shut_down:
+                self._poll_job = self.window.after(self.poll_interval, self._poll)
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            self.logger.exception("Error in db worker callback: {}".format(str(e)))
+
+    def shutdown(self):
+        self._shut_down = True
+        self.window.after_cancel(self._poll_job)
+        for job in list(self.jobs):
+            job.cancel()
+        self.executor.shutdown(wait=True)
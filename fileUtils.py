@@ -0,0 +1,23 @@
+import os
+import threading
+
+__umask_lock__ = threading.Lock()
+
+
+def replace_file(tmp_path, path):
+    '''
+    replaces path with the temporary file, giving it the mode of the file it replaces, or the mode a new file would get.
+    tempfile.mkstemp creates files only their owner can read
+    :param tmp_path: temporary file in the same directory as path
+    :param path:
+    '''
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        # the umask can only be read by setting it
+        with __umask_lock__:
+            umask = os.umask(0o22)
+            os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
@@ -1,16 +1,26 @@
+import os
 import logging
+import multiprocessing
 from os.path import join, dirname
 from dotenv import load_dotenv
 from app import App
 
 
-def get_logger(file_name):
+def get_logger(file_name, slow_query_file_name):
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(logging.DEBUG if os.environ.get("DEBUG", "0") == "1" else logging.INFO)
     fh = logging.FileHandler(file_name)
     fh.setLevel(logging.DEBUG)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     fh.setFormatter(formatter)
+    logger.addHandler(fh)
+
+    # queries slower than SLOW_QUERY_MS, only logged with DEBUG=1
+    slow_logger = logger.getChild("slow_queries")
+    slow_logger.propagate = False
+    sfh = logging.FileHandler(slow_query_file_name, delay=True)
+    sfh.setFormatter(formatter)
+    slow_logger.addHandler(sfh)
     return logger
 
 
@@ -18,9 +28,11 @@ def main():
     dotenv_path = join(dirname(__file__), '.env')
     load_dotenv(dotenv_path)
 
-    budgetPy = App(get_logger("app.log"))
+    budgetPy = App(get_logger("app.log", "slow_queries.log"))
     budgetPy.run()
 
 
 if __name__ == "__main__":
+    # workbooks are imported by spawned processes, which a frozen build has to hand over to multiprocessing
+    multiprocessing.freeze_support()
     main()
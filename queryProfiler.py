@@ -0,0 +1,232 @@
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    '''
+    cursor that reports every statement it runs to the QueryProfiler of its connection. Time spent fetching rows is
+    added to the statement, sqlite only steps through the rows of a query as they are fetched
+    '''
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._statement = self.connection.profiler.record(sql, parameters, perf_counter() - start,
+                                                              max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # the parameters may be a generator, only the number of rows is kept
+            self._statement = self.connection.profiler.record(sql, None, perf_counter() - start,
+                                                              max(self.rowcount, 0))
+
+    def _fetched(self, start, rows):
+        statement = getattr(self, "_statement", None)
+        if statement:
+            statement[2] += perf_counter() - start
+            statement[3] += rows
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = perf_counter()
+        row = super().__next__()
+        self._fetched(start, 1)
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    '''
+    connection whose cursors, including the ones execute and executemany create, are ProfiledCursors
+    '''
+    profiler = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # the shortcuts of sqlite3.Connection create their cursor without going through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Action(object):
+    '''
+    one run of a UI action, the statements run for it may come from several threads
+    '''
+    __slots__ = ("name", "started", "queries", "query_seconds", "rows")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = perf_counter()
+        self.queries = 0
+        self.query_seconds = 0
+        self.rows = 0
+
+
+class QueryProfiler(object):
+    '''
+    times every statement run through the connections of a DBManager and rolls them up per UI action. Statements
+    slower than the threshold are written to the slow query log.
+
+    When disabled, connections are not profiled and the action methods do nothing, so callers do not need to check
+    '''
+    def __init__(self, logger, slow_logger, enabled=False, slow_query_ms=50, max_samples=1000, *args, **kwargs):
+        '''
+        :param logger: every statement is logged at debug level
+        :param slow_logger: statements that take at least slow_query_ms are logged here as warnings
+        :param enabled: whether connections are profiled
+        :param slow_query_ms: threshold of the slow query log, in milliseconds
+        :param max_samples: number of latest runs of each action kept for the percentiles
+        '''
+        super().__init__(*args, **kwargs)
+        self.logger = logger
+        self.slow_logger = slow_logger
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.max_samples = max_samples
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {}  # action name -> [runs, latencies, queries, query seconds, rows]
+
+    def _get_local(self):
+        if not hasattr(self._local, "statements"):
+            self._local.statements = []
+            self._local.action = None
+        return self._local
+
+    def record(self, sql, parameters, seconds, rows):
+        '''
+        called by ProfiledCursor for every statement it runs
+        :return: the entry of the statement, [sql, parameters, seconds, rows], fetches are added to it
+        '''
+        statement = [sql, parameters, seconds, rows]
+        self._get_local().statements.append(statement)
+        return statement
+
+    def end_unit(self):
+        '''
+        called by DBManager at the end of every outermost unit of work, logs the statements run on the current thread
+        since the last call and adds them to the action the thread is working for
+        '''
+        local = self._get_local()
+        statements, local.statements = local.statements, []
+        for sql, parameters, seconds, rows in statements:
+            sql = " ".join(sql.split())
+            self.logger.debug("{:.3f} ms, {} rows: {} {}".format(seconds * 1e3, rows, sql, parameters))
+            if seconds >= self.slow_query_seconds:
+                self.slow_logger.warning("{:.3f} ms, {} rows, action {}: {} {}".format(
+                    seconds * 1e3, rows, local.action.name if local.action else None, sql, parameters))
+            if local.action:
+                local.action.queries += 1
+                local.action.query_seconds += seconds
+                local.action.rows += rows
+
+    def start_action(self, name):
+        '''
+        :param name: name the runs of the action are rolled up under
+        :return: the action, to be passed to in_action and finish_action, none when disabled
+        '''
+        return Action(name) if self.enabled else None
+
+    @contextmanager
+    def in_action(self, action):
+        '''
+        statements run on the current thread inside the block are counted for the action
+        '''
+        if action is None:
+            yield
+            return
+        local = self._get_local()
+        outer, local.action = local.action, action
+        try:
+            yield
+        finally:
+            local.action = outer
+
+    def finish_action(self, action):
+        '''
+        records the time since the action started. Actions that are never finished, e.g. superseded navigations, are
+        not counted
+        '''
+        if action is None:
+            return
+        latency = perf_counter() - action.started
+        with self._lock:
+            stats = self._stats.get(action.name)
+            if not stats:
+                stats = self._stats[action.name] = [0, deque(maxlen=self.max_samples), 0, 0, 0]
+            stats[0] += 1
+            stats[1].append(latency)
+            stats[2] += action.queries
+            stats[3] += action.query_seconds
+            stats[4] += action.rows
+
+    @contextmanager
+    def action(self, name):
+        '''
+        times the block as a run of the action
+        '''
+        action = self.start_action(name)
+        try:
+            with self.in_action(action):
+                yield
+        finally:
+            self.finish_action(action)
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def report(self):
+        '''
+        :return: list of dicts with the latency percentiles in ms over the latest runs of each action, and the mean
+        number of queries, query time and rows per run, slowest p90 first
+        '''
+        with self._lock:
+            stats = [(name, runs, sorted(latencies), queries, query_seconds, rows)
+                     for name, (runs, latencies, queries, query_seconds, rows) in self._stats.items()]
+        report = []
+        for name, runs, ordered, queries, query_seconds, rows in stats:
+            report.append({
+                "action": name,
+                "runs": runs,
+                "p50_ms": self._percentile(ordered, 0.5) * 1e3,
+                "p90_ms": self._percentile(ordered, 0.9) * 1e3,
+                "p99_ms": self._percentile(ordered, 0.99) * 1e3,
+                "max_ms": ordered[-1] * 1e3,
+                "queries": queries / runs,
+                "query_ms": query_seconds / runs * 1e3,
+                "rows": rows / runs,
+            })
+        report.sort(key=lambda row: row["p90_ms"], reverse=True)
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
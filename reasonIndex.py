@@ -0,0 +1,175 @@
+import heapq
+import threading
+from math import log2
+
+
+class _Node(object):
+    __slots__ = ("children", "reasons", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.reasons = set()  # reasons that end at this node, spellings that only differ in case share a node
+        self.top = None  # cached best (rank, reason) of the subtree, none until asked for or when out of date
+
+
+class ReasonIndex(object):
+    '''
+    case insensitive prefix trie of the distinct reasons of a table, for suggesting reasons as they are typed. Reasons
+    are kept as str.
+
+    Reasons are ranked by how often they were used, with every use counting half as much for every half_life records
+    entered after it, so reasons used often lately come first. The scores only depend on record ids, a use is added
+    with the id of its record and removed the same way. Safe to use from the db worker threads.
+
+    The index is only built when suggestions are first asked for, uses added or removed before then are ignored
+    '''
+    def __init__(self, load=None, half_life=500, num_suggestions=8, *args, **kwargs):
+        '''
+        :param load: called when the index is first needed, returns the rows to build it from, see build
+        :param half_life: number of records after which a use of a reason counts half as much
+        :param num_suggestions: maximum number of suggestions, the best ones are cached in every node of the trie
+        '''
+        super().__init__(*args, **kwargs)
+        self.load = load
+        self.half_life = half_life
+        self.num_suggestions = num_suggestions
+        self._lock = threading.Lock()
+        self.built = False
+        self.clear()
+
+    def clear(self):
+        self._root = _Node()
+        # reason -> [uses, score as of the id, id], so the rank of a reason only changes when it is used
+        self._stats = {}
+        # records older than the ones the index was built from were never added, so they are not removed either
+        self._first_id = 0
+
+    def invalidate(self):
+        '''
+        empties the index, it is loaded again when suggestions are next asked for
+        '''
+        with self._lock:
+            self.clear()
+            self.built = False
+
+    def __len__(self):
+        return len(self._stats)
+
+    def _rank(self, stats):
+        return log2(stats[1]) + stats[2] / self.half_life
+
+    def build(self, rows):
+        '''
+        replaces the index with the reasons of the rows
+        :param rows: iterable of (id, reason), of every record of the table from some id on
+        '''
+        stats, first_id = {}, None
+        for id, reason in rows:
+            self._add_use(stats, str(reason), id)
+            first_id = id if first_id is None else min(id, first_id)
+        with self._lock:
+            self.clear()
+            self.built = True
+            self._stats = stats
+            self._first_id = first_id if first_id is not None else 0
+            for reason in stats:
+                self._path(reason.lower(), create=True)[-1].reasons.add(reason)
+
+    def _add_use(self, stats, reason, id):
+        use = stats.get(reason)
+        if not use:
+            stats[reason] = [1, 1.0, id]
+        elif id >= use[2]:
+            use[0] += 1
+            use[1] = use[1] * 0.5 ** ((id - use[2]) / self.half_life) + 1
+            use[2] = id
+        else:
+            use[0] += 1
+            use[1] += 0.5 ** ((use[2] - id) / self.half_life)
+
+    def _path(self, key, create=False):
+        '''
+        :param key: lower case reason
+        :return: the nodes from the root to the node of the key, or to the deepest node there is if not create
+        '''
+        nodes = [self._root]
+        for char in key:
+            node = nodes[-1].children.get(char)
+            if not node:
+                if not create:
+                    break
+                node = nodes[-1].children[char] = _Node()
+            nodes.append(node)
+        return nodes
+
+    def add(self, reason, id):
+        '''
+        :param reason: reason of a record inserted into the table
+        :param id: id of the record
+        '''
+        reason = str(reason)
+        with self._lock:
+            if not self.built:
+                return
+            new = reason not in self._stats
+            self._add_use(self._stats, reason, id)
+            rank = self._rank(self._stats[reason])
+            nodes = self._path(reason.lower(), create=True)
+            if new:
+                nodes[-1].reasons.add(reason)
+            # the rank only went up, so it only has to be put in the cached best ones of the nodes on its path
+            for node in nodes:
+                if node.top is not None:
+                    top = [entry for entry in node.top if entry[1] != reason] + [(rank, reason)]
+                    top.sort(reverse=True)
+                    node.top = top[:self.num_suggestions]
+
+    def remove(self, reason, id):
+        '''
+        :param reason: reason of a record deleted from the table
+        :param id: id of the record
+        '''
+        reason = str(reason)
+        with self._lock:
+            use = self._stats.get(reason) if self.built else None
+            if not use or id < self._first_id:
+                return
+            nodes = self._path(reason.lower())
+            use[0] -= 1
+            if use[0] <= 0:
+                del self._stats[reason]
+                nodes[-1].reasons.discard(reason)
+            else:
+                # floating point errors must not leave a used reason without a score
+                use[1] = max(use[1] - 0.5 ** ((use[2] - id) / self.half_life), 1e-300)
+            # the rank only went down, the nodes that had it among their best ones have to look for a replacement
+            for node in nodes:
+                if node.top is not None and any(entry[1] == reason for entry in node.top):
+                    node.top = None
+
+    def suggest(self, prefix, num=None):
+        '''
+        :param prefix: start of a reason, case does not matter
+        :param num: maximum number of suggestions, at most num_suggestions
+        :return: the best ranked reasons starting with the prefix, best first
+        '''
+        key = str(prefix).lower()
+        if not self.built and self.load:
+            self.build(self.load())
+        with self._lock:
+            nodes = self._path(key)
+            if len(nodes) != len(key) + 1:
+                return []
+            node = nodes[-1]
+            if node.top is None:
+                node.top = heapq.nlargest(self.num_suggestions, ((self._rank(self._stats[reason]), reason)
+                                                                 for reason in self._reasons_under(node)))
+            return [reason for _, reason in node.top[:num if num else self.num_suggestions]]
+
+    @staticmethod
+    def _reasons_under(node):
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            yield from node.reasons
+            nodes.extend(node.children.values())
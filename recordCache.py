@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class RecordCache(object):
+    '''
+    bounded LRU cache of record pages in front of DBManager, entries of a table are dropped whenever records are
+    inserted into or deleted from it. Safe to use from the db worker threads
+    '''
+    def __init__(self, dm, size, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dm = dm
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0  # bumped on every invalidation, so pages read before it are not stored after it
+
+        dm.add_write_listener(self.invalidate)
+
+    def _get(self, method_name, *args):
+        key = (self.dm.__table__, method_name, args)
+        with self._lock:
+            if key in self._pages:
+                self.hits += 1
+                self._pages.move_to_end(key)
+                return self._pages[key]
+            self.misses += 1
+            version = self._version
+
+        records = getattr(self.dm, method_name)(*args)
+        with self._lock:
+            if version == self._version:
+                self._pages[key] = records
+                if len(self._pages) > self.size:
+                    self._pages.popitem(last=False)
+        return records
+
+    def get_records_after_id(self, id, offset):
+        return self._get("get_records_after_id", id, offset)
+
+    def get_records_older_than_id(self, id, num):
+        return self._get("get_records_older_than_id", id, num)
+
+    def get_records_newer_than_id(self, id, num):
+        return self._get("get_records_newer_than_id", id, num)
+
+    def get_withdraws_before_date(self, date=None, num=1):
+        return self._get("get_withdraws_before_date", date, num)
+
+    def invalidate(self, table=None):
+        '''
+        :param table: table whose pages are dropped, if none, drop every page
+        '''
+        with self._lock:
+            self._version += 1
+            for key in [key for key in self._pages if table is None or key[0] == table]:
+                del self._pages[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": self.size, "pages": len(self._pages), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0}
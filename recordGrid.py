@@ -0,0 +1,56 @@
+from tkinter import Label, W
+
+
+class RecordGrid(object):
+    '''
+    grid of date / reason / amount labels with the total and monthly total below them. The labels are created once and
+    only their text changes between renders, rows are only added or removed when the number of rows changes
+    '''
+    def __init__(self, frame, num_rows, monthly_total_text="Monthly Total", *args, **kwargs):
+        '''
+        :param frame:
+        :param num_rows:
+        :param monthly_total_text: label of the second total, e.g. for a total that is not of the month
+        '''
+        super().__init__(*args, **kwargs)
+        self.frame = frame
+        self.rows = []
+        self.monthly_total_text = monthly_total_text
+
+        self.total = Label(frame, text="Total: {:.2f}".format(0), fg="black", bg="white", borderwidth=2,
+                           relief="ridge")
+        self.monthly_total = Label(frame, text="{}: {:.2f}".format(monthly_total_text, 0), fg="black", bg="white",
+                                   borderwidth=2, relief="ridge")
+        self.resize(num_rows)
+
+    @property
+    def num_rows(self):
+        return len(self.rows)
+
+    def resize(self, num_rows):
+        while len(self.rows) < num_rows:
+            index = len(self.rows)
+            self.rows.append([Label(self.frame, text="", fg="black", bg="white") for _ in range(3)])
+            for column, label in enumerate(self.rows[index]):
+                label.grid(row=index, column=column, padx=5, sticky=W)
+
+        while len(self.rows) > num_rows:
+            for label in self.rows.pop():
+                label.destroy()
+
+        self.total.grid(row=num_rows, pady=5, sticky=W)
+        self.monthly_total.grid(row=num_rows, column=1, pady=5, sticky=W)
+
+    def display(self, records, total=0, monthly_total=0):
+        '''
+        :param records: rows of (id, date, reason, amount), rows after the last record are left empty
+        :param total:
+        :param monthly_total:
+        '''
+        for index, labels in enumerate(self.rows):
+            values = records[index][1:4] if index < len(records) else ("", "", "")
+            for label, value in zip(labels, values):
+                label.configure(text=value)
+
+        self.total.configure(text="Total: {:.2f}".format(total))
+        self.monthly_total.configure(text="{}: {:.2f}".format(self.monthly_total_text, monthly_total))
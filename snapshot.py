@@ -0,0 +1,107 @@
+'''
+.bp snapshot format, version 1, all numbers little endian:
+
+    header      magic "BPSNAP" and two zero bytes, version uint32, number of rows uint64, number of distinct reasons uint32,
+                length of the table name uint32, table name utf-8, zero padding to a multiple of 8 bytes
+    columns     ids int64[rows], amounts float64[rows], dates int32[rows] as day ordinals,
+                reasons uint32[rows] as indexes into the string table
+    strings     offsets uint32[reasons + 1] into the blob, utf-8 blob of every distinct reason
+'''
+
+import os
+import sys
+import mmap
+import struct
+import tempfile
+from array import array
+from datetime import date
+from fileUtils import replace_file
+
+__magic__ = b"BPSNAP\0\0"
+__version__ = 1
+__header__ = struct.Struct("<8sIQII")
+
+
+def is_snapshot(path):
+    with open(path, "rb") as f:
+        return f.read(len(__magic__)) == __magic__
+
+
+def write_snapshot(path, table, rows):
+    '''
+    :param path: the file is written to a temporary path first, and renamed into place once complete
+    :param table: name of the table
+    :param rows: iterable of (id, date str, reason, amount), consumed in a single pass
+    :return: number of rows written
+    '''
+    ids, amounts, dates, codes = array("q"), array("d"), array("i"), array("I")
+    reasons, ordinals = {}, {}
+    for id, date_s, reason, amount in rows:
+        ids.append(id)
+        amounts.append(amount)
+        if date_s not in ordinals:
+            ordinals[date_s] = date(*map(int, date_s.split("-"))).toordinal()
+        dates.append(ordinals[date_s])
+        codes.append(reasons.setdefault(reason, len(reasons)))
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for reason in reasons:  # dicts keep insertion order, which is the order of the codes
+        blob += str(reason).encode("utf-8")
+        offsets.append(len(blob))
+
+    name = table.encode("utf-8")
+    header = __header__.pack(__magic__, __version__, len(ids), len(reasons), len(name)) + name
+    header += b"\0" * (-len(header) % 8)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".bp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for column in (ids, amounts, dates, codes, offsets):
+                if sys.byteorder == "big":
+                    column.byteswap()
+                column.tofile(f)
+            f.write(blob)
+        replace_file(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return len(ids)
+
+
+def read_snapshot(path):
+    '''
+    :param path:
+    :return: table name and list of (id, date str, reason, amount), read from a memory map of the file
+    '''
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < __header__.size:
+            raise ValueError("{} is not a BudgetPy snapshot".format(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, num_rows, num_reasons, name_length = __header__.unpack_from(mm, 0)
+            if magic != __magic__:
+                raise ValueError("{} is not a BudgetPy snapshot".format(path))
+            if version != __version__:
+                raise ValueError("snapshot version {} of {} is not supported".format(version, path))
+
+            pos = __header__.size
+            table = mm[pos:pos + name_length].decode("utf-8")
+            pos += name_length
+            pos += -pos % 8
+
+            columns = []
+            for typecode, length in (("q", num_rows), ("d", num_rows), ("i", num_rows), ("I", num_rows),
+                                     ("I", num_reasons + 1)):
+                column = array(typecode)
+                column.frombytes(mm[pos:pos + length * column.itemsize])
+                if sys.byteorder == "big":
+                    column.byteswap()
+                columns.append(column)
+                pos += length * column.itemsize
+            ids, amounts, dates, codes, offsets = columns
+
+            reasons = [mm[pos + offsets[i]:pos + offsets[i + 1]].decode("utf-8") for i in range(num_reasons)]
+
+    date_strs = {ordinal: date.fromordinal(ordinal).isoformat() for ordinal in set(dates)}
+    return table, list(zip(ids, [date_strs[ordinal] for ordinal in dates], [reasons[code] for code in codes], amounts))